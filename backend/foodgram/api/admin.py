@@ -1,9 +1,82 @@
+from django.conf import settings
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
-from recipes.models import Recipe, Tag, Ingredient, Favorite
+from recipes.models import Recipe, Tag, Ingredient
 from users.models import CustomUser
 
 
+class EstimatedCountPaginator(Paginator):
+    """Число строк без фильтров в Postgres - из pg_class.reltuples"""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class '
+                    'WHERE oid = to_regclass(%s)',
+                    [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] >= settings.ADMIN_COUNT_ESTIMATE_FROM:
+
+                return int(row[0])
+
+        return super().count
+
+
+class InputFilter(admin.SimpleListFilter):
+    """Фильтр с полем ввода вместо списка всех значений"""
+    template = 'admin/input_filter.html'
+    placeholder = ''
+
+    def lookups(self, request, model_admin):
+        # Без вариантов фильтр не показывается (has_output)
+
+        return (('', ''),)
+
+    def choices(self, changelist):
+        all_choice = next(super().choices(changelist))
+        all_choice['query_parts'] = [
+            (name, value) for name, value in changelist.params.items()
+            if name not in (self.parameter_name, 'p')]
+        yield all_choice
+
+
+class AuthorFilter(InputFilter):
+    title = 'автору'
+    parameter_name = 'author'
+    placeholder = 'id или имя пользователя'
+
+    def queryset(self, request, queryset):
+        value = (self.value() or '').strip()
+        if not value:
+
+            return queryset
+        if value.isdigit():
+
+            return queryset.filter(author_id=value)
+
+        return queryset.filter(author__username=value)
+
+
+class NameFilter(InputFilter):
+    title = 'началу названия'
+    parameter_name = 'name'
+
+    def queryset(self, request, queryset):
+        value = (self.value() or '').strip()
+        if not value:
+
+            return queryset
+
+        return queryset.filter(name__istartswith=value)
+
+
 class TagInline(admin.TabularInline):
     model = Recipe.tags.through
     extra = 1
@@ -21,28 +94,33 @@ class IngredientInline(admin.TabularInline):
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('pk', 'name', 'author', 'shorttext', 'created',
-                    'image', 'cooking_time', 'favorited',)
+                    'image', 'cooking_time', 'favorites_count',
+                    'in_carts_count',)
+    list_select_related = ('author',)
     inlines = (TagInline, IngredientInline,)
     search_fields = ('name',)
-    list_filter = ('author', 'name', 'tags',)
+    list_filter = (AuthorFilter, NameFilter, 'tags',)
     empty_value_display = '-пусто-'
     autocomplete_fields = ('author',)
-
-    def favorited(self, obj):
-
-        return Favorite.objects.filter(recipe=obj).count()
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(CustomUser)
 class CustomUserAdmin(admin.ModelAdmin):
+    list_display = ('username', 'email', 'recipes_count', 'followers_count',)
     search_fields = ('username', 'email')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('name', 'measurement_unit',)
     search_fields = ('name',)
-    list_filter = ('name',)
+    list_filter = (NameFilter,)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Tag)
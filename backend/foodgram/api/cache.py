@@ -0,0 +1,40 @@
+"""Версии закэшированных данных"""
+import time
+from hashlib import md5
+
+from django.core.cache import cache
+from django.utils.http import parse_etags
+
+
+def get_version(name):
+    key = f'{name}:version'
+    version = cache.get(key)
+    if version is not None:
+
+        return version
+    cache.add(key, time.time_ns(), timeout=None)
+
+    return cache.get(key)
+
+
+def bump_version(name):
+    try:
+        cache.incr(f'{name}:version')
+    except ValueError:
+        get_version(name)
+
+
+def make_etag(content):
+    """Сильный ETag по байтам ответа"""
+
+    return f'"{md5(content).hexdigest()}"'
+
+
+def etag_matches(request, etag):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if not if_none_match:
+
+        return False
+    etags = parse_etags(if_none_match)
+
+    return '*' in etags or etag in etags
@@ -0,0 +1,76 @@
+"""Индекс "ингредиент -> рецепты" в памяти процесса"""
+import threading
+import time
+from array import array
+from collections import Counter
+
+from django.conf import settings
+
+from recipes.models import Recipe, RecipeIngredient
+from .cache import bump_version, get_version
+
+
+VERSION = 'cookable_index'
+
+
+class CookableIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (id рецептов в порядке ленты, число ингредиентов рецепта,
+        # {ingredient_id: позиции рецептов в первом списке})
+        self._data = ([], array('I'), {})
+        self._version = None
+        self._built_at = None
+
+    def _is_stale(self, version):
+        ttl = getattr(settings, 'COOKABLE_INDEX_TTL', 300)
+
+        return (self._built_at is None
+                or version != self._version
+                or time.monotonic() - self._built_at > ttl)
+
+    def _build(self, version):
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        positions = {pk: position for position, pk in enumerate(recipe_ids)}
+        sizes = array('I', [0]) * len(recipe_ids)
+        postings = {}
+        rows = RecipeIngredient.objects.order_by().values_list(
+            'ingredient_id', 'recipe_id')
+        for ingredient_id, recipe_id in rows.iterator():
+            position = positions.get(recipe_id)
+            if position is None:
+                continue
+            sizes[position] += 1
+            postings.setdefault(ingredient_id, array('I')).append(position)
+        self._data = (recipe_ids, sizes, postings)
+        self._version = version
+        self._built_at = time.monotonic()
+
+    def match(self, ingredients, exclude=()):
+        """[(recipe_id, недостающих ингредиентов)], полные рецепты первыми"""
+        version = get_version(VERSION)
+        if self._is_stale(version):
+            with self._lock:
+                if self._is_stale(version):
+                    self._build(version)
+        recipe_ids, sizes, postings = self._data
+        matched = Counter()
+        for ingredient_id in set(ingredients):
+            matched.update(postings.get(ingredient_id, ()))
+        excluded = set()
+        for ingredient_id in set(exclude):
+            excluded.update(postings.get(ingredient_id, ()))
+        ranked = sorted(
+            (sizes[position] - count, -count, position)
+            for position, count in matched.items()
+            if position not in excluded)
+
+        return [(recipe_ids[position], missing)
+                for missing, _, position in ranked]
+
+    def invalidate(self):
+        self._built_at = None
+        bump_version(VERSION)
+
+
+cookable_index = CookableIndex()
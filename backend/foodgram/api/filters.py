@@ -3,9 +3,14 @@ import django_filters
 from django.contrib.auth import get_user_model
 
 from recipes.models import Recipe, Tag, Ingredient
+from recipes.search import search
 
 User = get_user_model()
 
+ORDERINGS = {
+    'popular': ('-favorites_count', '-created', '-id'),
+}
+
 
 class IngredientFilter(django_filters.FilterSet):
     name = django_filters.CharFilter(
@@ -32,6 +37,13 @@ class RecipeFilter(django_filters.FilterSet):
         field_name='tags__slug',
         to_field_name='slug',
     )
+    search = django_filters.CharFilter(
+        method='get_search_queryset'
+    )
+    ordering = django_filters.ChoiceFilter(
+        choices=(('popular', 'По популярности'),),
+        method='get_ordering_queryset'
+    )
 
     class Meta:
         model = Recipe
@@ -52,3 +64,16 @@ class RecipeFilter(django_filters.FilterSet):
             return queryset.filter(shopping_recipe__user=user)
 
         return queryset
+
+    def get_search_queryset(self, queryset, name, value):
+        """Полнотекстовый поиск, сортировка по релевантности"""
+        if value.strip():
+
+            return search(queryset, value)
+
+        return queryset
+
+    def get_ordering_queryset(self, queryset, name, value):
+        """?ordering=popular - по числу добавлений в избранное"""
+
+        return queryset.order_by(*ORDERINGS[value])
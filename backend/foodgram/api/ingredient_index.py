@@ -0,0 +1,65 @@
+"""Индекс ингредиентов в памяти процесса для автодополнения"""
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+from recipes.models import Ingredient
+from .cache import bump_version, get_version
+
+
+VERSION = 'ingredient_index'
+
+
+class IngredientIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []
+        self._rows = []
+        self._version = None
+        self._built_at = None
+
+    def _is_stale(self, version):
+        ttl = getattr(settings, 'INGREDIENT_INDEX_TTL', 300)
+
+        return (self._built_at is None
+                or version != self._version
+                or time.monotonic() - self._built_at > ttl)
+
+    def _build(self, version):
+        rows = sorted(
+            Ingredient.objects.values_list('name', 'id', 'measurement_unit'),
+            key=lambda row: (row[0].casefold(), row[1]))
+        self._keys = [name.casefold() for name, _, _ in rows]
+        self._rows = [{'id': pk, 'name': name, 'measurement_unit': unit}
+                      for name, pk, unit in rows]
+        self._version = version
+        self._built_at = time.monotonic()
+
+    def search(self, prefix, limit=None):
+        """Ингредиенты с названием на prefix, без учёта регистра"""
+        if limit is None:
+            limit = getattr(settings, 'INGREDIENT_SEARCH_LIMIT', 50)
+        version = get_version(VERSION)
+        if self._is_stale(version):
+            with self._lock:
+                if self._is_stale(version):
+                    self._build(version)
+        keys, rows = self._keys, self._rows
+        prefix = prefix.casefold()
+        result = []
+        position = bisect_left(keys, prefix)
+        while (position < len(keys) and len(result) < limit
+               and keys[position].startswith(prefix)):
+            result.append(rows[position])
+            position += 1
+
+        return result
+
+    def invalidate(self):
+        self._built_at = None
+        bump_version(VERSION)
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,146 @@
+"""Облегчённое чтение для горячих GET-эндпойнтов"""
+from operator import attrgetter
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.encoding import filepath_to_uri
+from django.utils.functional import cached_property
+from rest_framework import serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+from rest_framework.settings import api_settings
+
+
+# Поля, чей to_representation - просто приведение типа
+CONVERTERS = (
+    (serializers.IntegerField, int),
+    (serializers.FloatField, float),
+    (serializers.CharField, str),
+)
+
+
+def file_url(file):
+    """То же, что file.url, но для FileSystemStorage без urljoin"""
+    storage = file.storage
+    if not file.name or not isinstance(storage, FileSystemStorage):
+
+        return file.url
+    path = filepath_to_uri(file.name).lstrip('/')
+    if '/.' in '/' + path:
+        # Пути с . и .. нормализует только urljoin
+        return file.url
+
+    return storage.base_url + path
+
+
+def absolute_url(request):
+    """build_absolute_uri с префиксом хоста, посчитанным один раз"""
+    if request is None:
+
+        return None
+    prefix = request.build_absolute_uri('/')[:-1]
+
+    def build(url):
+        if (url.startswith('/') and not url.startswith('//')
+                and '/./' not in url and '/../' not in url):
+
+            return prefix + url
+
+        return request.build_absolute_uri(url)
+
+    return build
+
+
+def convert(source, converter):
+    get = attrgetter(source)
+
+    def accessor(instance):
+        value = get(instance)
+
+        return None if value is None else converter(value)
+
+    return accessor
+
+
+def image(source, build_absolute):
+    """Как serializers.ImageField с use_url"""
+    get = attrgetter(source)
+
+    def accessor(instance):
+        value = get(instance)
+        if not value:
+
+            return None
+        url = file_url(value)
+
+        return url if build_absolute is None else build_absolute(url)
+
+    return accessor
+
+
+def fallback(field):
+    """Одно поле так же, как в Serializer.to_representation"""
+
+    def accessor(instance):
+        attribute = field.get_attribute(instance)
+        if isinstance(attribute, PKOnlyObject):
+            check_for_none = attribute.pk
+        else:
+            check_for_none = attribute
+        if check_for_none is None:
+
+            return None
+
+        return field.to_representation(attribute)
+
+    return accessor
+
+
+class LeanSerializerMixin:
+    """to_representation по плану полей, собранному один раз"""
+
+    def get_lean_accessor(self, field, model_fields, build_absolute):
+        source = field.source
+        if isinstance(field, serializers.SerializerMethodField):
+
+            return getattr(self, field.method_name)
+        if source not in model_fields:
+
+            return fallback(field)
+        if (isinstance(field, serializers.ImageField)
+                and type(field).to_representation
+                is serializers.ImageField.to_representation
+                and getattr(field, 'use_url',
+                            api_settings.UPLOADED_FILES_USE_URL)):
+
+            return image(source, build_absolute)
+        for base, converter in CONVERTERS:
+            if (isinstance(field, base) and type(field).to_representation
+                    is base.to_representation):
+
+                return convert(source, converter)
+
+        return fallback(field)
+
+    @cached_property
+    def lean_fields(self):
+        model = getattr(getattr(self, 'Meta', None), 'model', None)
+        model_fields = set()
+        if model is not None:
+            # Для внешних ключей attname - author_id, а не сам объект
+            model_fields = {model_field.attname for model_field
+                            in model._meta.concrete_fields}
+        build_absolute = absolute_url(self.context.get('request'))
+
+        return [(field.field_name,
+                 self.get_lean_accessor(field, model_fields, build_absolute))
+                for field in self._readable_fields]
+
+    def to_representation(self, instance):
+        representation = {}
+        for name, accessor in self.lean_fields:
+            try:
+                representation[name] = accessor(instance)
+            except SkipField:
+                continue
+
+        return representation
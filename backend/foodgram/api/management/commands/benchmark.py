@@ -0,0 +1,177 @@
+import json
+import statistics
+import time
+from pathlib import Path
+from urllib.parse import quote
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, Tag
+
+
+User = get_user_model()
+
+
+class QueryTimer:
+    """execute_wrapper: считает запросы и время в базе"""
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время, число запросов, время SQL и размер ответа '
+            'основных эндпойнтов и сравнивает с сохранённым baseline. '
+            'Данные готовятся заранее: generate_dataset --seed 42.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--user', type=int, help='id пользователя')
+        parser.add_argument('--output', type=Path,
+                            help='Куда записать результаты (JSON)')
+        parser.add_argument('--baseline', type=Path,
+                            help='Результаты прошлого прогона для сравнения')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Допустимый рост медианы времени, доля (0.2 = 20%%)')
+        parser.add_argument('--only', help='Запускать сценарии с этой '
+                                           'подстрокой в названии')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        results = {}
+        for name, requests in self.scenarios(user):
+            if options['only'] and options['only'] not in name:
+                continue
+            results[name] = self.measure(client, requests, options['repeat'])
+            self.stdout.write(self.format_line(name, results[name]))
+        report = {
+            'meta': {'vendor': connection.vendor,
+                     'repeat': options['repeat'],
+                     'user': user.id},
+            'results': results,
+        }
+        if options['output']:
+            options['output'].write_text(json.dumps(report, indent=2))
+        else:
+            self.stdout.write(json.dumps(report))
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['tolerance'])
+
+    def get_user(self, user_id):
+        if user_id is not None:
+            return User.objects.get(pk=user_id)
+        user = User.objects.annotate(
+            carts=Count('shoppingcart')).order_by('-carts', 'id').first()
+        if user is None:
+            raise CommandError('База пуста: запустите generate_dataset')
+
+        return user
+
+    def scenarios(self, user):
+        """(название, [(метод, url), ...]) - запросы одного повтора"""
+        recipe = Recipe.objects.exclude(favorite_recipe__user=user).exclude(
+            shopping_recipe__user=user).order_by('id').first()
+        author = User.objects.exclude(pk=user.pk).exclude(
+            following__user=user).order_by('id').first()
+        tag = Tag.objects.order_by('id').first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        recipes = '/api/recipes/'
+        yield 'recipes', [('get', recipes)]
+        yield 'recipes?limit=50', [('get', f'{recipes}?limit=50')]
+        yield 'recipes?cursor', [('get', f'{recipes}?cursor=')]
+        yield 'recipes?tags', [('get', f'{recipes}?tags={tag.slug}')]
+        yield 'recipes?author', [
+            ('get', f'{recipes}?author={recipe.author_id}')]
+        yield 'recipes?is_favorited', [('get', f'{recipes}?is_favorited=1')]
+        yield 'recipes?is_in_shopping_cart', [
+            ('get', f'{recipes}?is_in_shopping_cart=1')]
+        yield 'recipes?ordering=popular', [
+            ('get', f'{recipes}?ordering=popular')]
+        yield 'recipes?search', [
+            ('get', f'{recipes}?search={quote(recipe.name.split()[0])}')]
+        pantry = '&'.join(
+            f'ingredients={pk}' for pk in Ingredient.objects.filter(
+                recipes__in=Recipe.objects.order_by('id')[:5]
+            ).values_list('id', flat=True).distinct()[:20])
+        yield 'recipes/cookable', [('get', f'{recipes}cookable/?{pantry}')]
+        yield 'recipe detail', [('get', f'{recipes}{recipe.id}/')]
+        yield 'recipes/feed', [('get', f'{recipes}feed/')]
+        yield 'recipes/trending', [('get', f'{recipes}trending/')]
+        yield 'subscriptions', [('get', '/api/users/subscriptions/')]
+        yield 'ingredients?name', [
+            ('get', f'/api/ingredients/?name={ingredient.name[:2]}')]
+        yield 'download_shopping_cart', [
+            ('get', f'{recipes}download_shopping_cart/')]
+        for toggle in ('favorite', 'shopping_cart'):
+            url = f'{recipes}{recipe.id}/{toggle}/'
+            yield f'{toggle} toggle', [('post', url), ('delete', url)]
+        if author is not None:
+            url = f'/api/users/{author.id}/subscribe/'
+            yield 'subscribe toggle', [('post', url), ('delete', url)]
+
+    def measure(self, client, requests, repeat):
+        timings, timer, size, statuses = [], QueryTimer(), 0, set()
+        for _ in range(repeat):
+            started = time.perf_counter()
+            with connection.execute_wrapper(timer):
+                for method, url in requests:
+                    response = getattr(client, method)(url)
+                    body = (b''.join(response.streaming_content)
+                            if response.streaming else response.content)
+                    size += len(body)
+                    statuses.add(response.status_code)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+
+        return {
+            'median_ms': round(statistics.median(timings) * 1000, 2),
+            'p95_ms': round(timings[int(len(timings) * 0.95) - 1] * 1000, 2),
+            'queries': timer.count / repeat,
+            'sql_ms': round(timer.seconds / repeat * 1000, 2),
+            'bytes': size // repeat,
+            'status': sorted(statuses),
+        }
+
+    def format_line(self, name, result):
+        return (f'{name:30} {result["median_ms"]:9.2f} ms '
+                f'p95 {result["p95_ms"]:9.2f} ms '
+                f'{result["queries"]:6.1f} q '
+                f'sql {result["sql_ms"]:8.2f} ms '
+                f'{result["bytes"]:9} B {result["status"]}')
+
+    def compare(self, results, baseline_path, tolerance):
+        baseline = json.loads(baseline_path.read_text())['results']
+        regressions = []
+        for name, result in results.items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            ratio = result['median_ms'] / max(before['median_ms'], 0.01)
+            slower = ratio > 1 + tolerance
+            more_queries = result['queries'] > before['queries']
+            if slower or more_queries:
+                regressions.append(name)
+            self.stdout.write(
+                f'{name:30} x{ratio:5.2f} время, запросов '
+                f'{before["queries"]:.1f} -> {result["queries"]:.1f}'
+                f'{"  РЕГРЕССИЯ" if slower or more_queries else ""}')
+        if regressions:
+            raise CommandError(f'Регрессии: {", ".join(regressions)}')
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
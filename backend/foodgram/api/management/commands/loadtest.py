@@ -0,0 +1,90 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.error import HTTPError
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+from rest_framework.authtoken.models import Token
+
+from .benchmark import Command as BenchmarkCommand
+
+
+class Command(BenchmarkCommand):
+    help = ('Пропускная способность запущенного сервера под параллельной '
+            'нагрузкой: GET-сценарии benchmark, --concurrency клиентов '
+            'одновременно. Сравнение режимов: один и тот же прогон против '
+            'SERVER_MODE=wsgi и SERVER_MODE=asgi.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000',
+                            help='Адрес сервера')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Запросов на сценарий')
+        parser.add_argument('--user', type=int, help='id пользователя')
+        parser.add_argument('--output', type=Path,
+                            help='Куда записать результаты (JSON)')
+        parser.add_argument('--only', help='Запускать сценарии с этой '
+                                           'подстрокой в названии')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        token, _ = Token.objects.get_or_create(user=user)
+        headers = {'Authorization': f'Token {token.key}'}
+        results = {}
+        for name, requests in self.scenarios(user):
+            if options['only'] and options['only'] not in name:
+                continue
+            if any(method != 'get' for method, _ in requests):
+                continue
+            urls = [options['url'] + quote(url, safe='/?&=%')
+                    for _, url in requests]
+            results[name] = self.load(urls, headers, options['concurrency'],
+                                      options['requests'])
+            self.stdout.write(self.format_load_line(name, results[name]))
+        report = {
+            'meta': {'url': options['url'],
+                     'concurrency': options['concurrency'],
+                     'requests': options['requests'],
+                     'user': user.id},
+            'results': results,
+        }
+        if options['output']:
+            options['output'].write_text(json.dumps(report, indent=2))
+        else:
+            self.stdout.write(json.dumps(report))
+
+    def fetch(self, urls, headers):
+        """(время, статус) одного повтора сценария"""
+        started, status = time.perf_counter(), None
+        for url in urls:
+            try:
+                with urlopen(Request(url, headers=headers)) as response:
+                    response.read()
+                    status = response.status
+            except HTTPError as error:
+                status = error.code
+
+        return time.perf_counter() - started, status
+
+    def load(self, urls, headers, concurrency, requests):
+        with ThreadPoolExecutor(concurrency) as pool:
+            started = time.perf_counter()
+            done = list(pool.map(lambda _: self.fetch(urls, headers),
+                                 range(requests)))
+            elapsed = time.perf_counter() - started
+        timings = sorted(seconds for seconds, _ in done)
+
+        return {
+            'rps': round(requests / elapsed, 1),
+            'p50_ms': round(timings[len(timings) // 2] * 1000, 2),
+            'p95_ms': round(timings[int(len(timings) * 0.95) - 1] * 1000, 2),
+            'status': sorted({status for _, status in done}),
+        }
+
+    def format_load_line(self, name, result):
+        return (f'{name:30} {result["rps"]:8.1f} rps '
+                f'p50 {result["p50_ms"]:9.2f} ms '
+                f'p95 {result["p95_ms"]:9.2f} ms {result["status"]}')
@@ -1,10 +1,59 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
 from rest_framework import mixins, viewsets
+from django.conf import settings
+from django.db import close_old_connections, transaction
 from django.shortcuts import get_object_or_404
 from recipes.models import Recipe
 from rest_framework.response import Response
 from rest_framework import status
 from api.permissions import IsAuthorOnly
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.settings import api_settings
+from api import toggles
+from api.serializers import BulkRecipesSerializer
+
+
+def run_view(view, request, *args, **kwargs):
+    """Представление с отрисовкой ответа в потоке пула"""
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            response.render()
+
+        return response
+    finally:
+        close_old_connections()
+
+
+def make_async(view):
+    """Чтение - в общем пуле потоков, запись - в одном потоке"""
+    read = sync_to_async(run_view, thread_sensitive=False)
+    write = sync_to_async(run_view)
+
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        run = read if request.method in SAFE_METHODS else write
+
+        return await run(view, request, *args, **kwargs)
+
+    return async_view
+
+
+class AsyncViewMixin:
+    """Под ASGI - адаптер, выносящий синхронный DRF в пул потоков"""
+
+    @classmethod
+    def as_view(cls, *args, **kwargs):
+        if settings.SERVER_MODE == 'asgi':
+
+            return make_async(super().as_view(*args, **kwargs))
+
+        return super().as_view(*args, **kwargs)
 
 
 class ListRetrieveViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin,
@@ -25,12 +74,15 @@ class CreateDestroyViewSet(mixins.CreateModelMixin, mixins.DestroyModelMixin,
 
         return super().get_permissions()
 
+    target_model = Recipe
+    target_field = 'recipe'
+    already_added_message = 'Вы уже добавляли этот рецепт'
+    not_added_message = 'Вы пытаетесь удалить отсутствующий в списке рецепт'
+
     def create(self, request, obj_id, model):
         if request.user.is_authenticated:
-            recipe = get_object_or_404(Recipe, pk=obj_id)
-            serializer = self.get_serializer(data=request.data)
-            serializer.is_valid(raise_exception=True)
-            model.objects.create(recipe=recipe, user=request.user)
+            if not self.perform_add(obj_id, model):
+                self.raise_toggle_error(obj_id, self.already_added_message)
 
             return Response({'Message': 'Добавление успешно'},
                             status=status.HTTP_201_CREATED)
@@ -38,15 +90,28 @@ class CreateDestroyViewSet(mixins.CreateModelMixin, mixins.DestroyModelMixin,
         return Response({'Errors': 'Пожалуйста, пройдите авторизацию'},
                         status=status.HTTP_401_UNAUTHORIZED)
 
+    def perform_add(self, obj_id, model):
+        """Один INSERT ... ON CONFLICT DO NOTHING; True, если связь создана"""
+
+        return toggles.add(
+            model, self.target_field, self.request.user.id, obj_id)
+
+    def perform_remove(self, obj_id, model):
+        """Один DELETE ... RETURNING; True, если связь была удалена"""
+
+        return toggles.remove(
+            model, self.target_field, self.request.user.id, obj_id)
+
+    def raise_toggle_error(self, obj_id, message):
+        """404, если объекта нет, иначе 400"""
+        get_object_or_404(self.target_model, pk=obj_id)
+        raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [message]})
+
     @action(methods=['delete'], detail=False)
     def delete(self, request, obj_id, model):
         if request.user.is_authenticated:
-            recipe = get_object_or_404(Recipe, pk=obj_id)
-            serializer = self.get_serializer(data=request.data)
-            serializer.is_valid(raise_exception=True)
-            model.objects.filter(
-                recipe_id=recipe.id,
-                user_id=request.user.id).delete()
+            if not self.perform_remove(obj_id, model):
+                self.raise_toggle_error(obj_id, self.not_added_message)
 
             return Response({
                 'Message': 'Удаление успешно'},
@@ -55,3 +120,50 @@ class CreateDestroyViewSet(mixins.CreateModelMixin, mixins.DestroyModelMixin,
 
         return Response({'Errors': 'Пожалуйста, пройдите авторизацию'},
                         status=status.HTTP_401_UNAUTHORIZED)
+
+
+class BulkToggleViewSet(viewsets.GenericViewSet):
+    """Массовое изменение корзины или избранного"""
+    serializer_class = BulkRecipesSerializer
+    permission_classes = (IsAuthenticated,)
+    model = None
+
+    def get_recipe_ids(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        return serializer.validated_data['recipes']
+
+    def perform_bulk_add(self, recipe_ids):
+        """Возвращает id реально добавленных рецептов"""
+
+        return toggles.add_many(
+            self.model, 'recipe', self.request.user.id, recipe_ids)
+
+    def perform_bulk_remove(self, recipe_ids):
+        """Возвращает id реально удалённых рецептов"""
+
+        return toggles.remove_many(
+            self.model, 'recipe', self.request.user.id, recipe_ids)
+
+    def add(self, request):
+        added = self.perform_bulk_add(self.get_recipe_ids(request))
+
+        return Response({'added': added, 'removed': []},
+                        status=status.HTTP_201_CREATED)
+
+    def remove(self, request):
+        removed = self.perform_bulk_remove(self.get_recipe_ids(request))
+
+        return Response({'added': [], 'removed': removed})
+
+    @transaction.atomic
+    def replace(self, request):
+        recipe_ids = self.get_recipe_ids(request)
+        current = set(self.model.objects.filter(
+            user=request.user).values_list('recipe_id', flat=True))
+        removed = self.perform_bulk_remove(current - set(recipe_ids))
+        added = self.perform_bulk_add(
+            [pk for pk in recipe_ids if pk not in current])
+
+        return Response({'added': added, 'removed': removed})
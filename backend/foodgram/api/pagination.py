@@ -1,6 +1,179 @@
-from rest_framework.pagination import PageNumberPagination
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination,
+                                       _reverse_ordering)
+
+
+RECIPES_LIMIT = 3
+TRENDING_DEFAULT_LIMIT = 10
+POSITION_SEPARATOR = '|'
+
+
+class KeysetCursorPagination(CursorPagination):
+    """Курсор по всем полям ordering: без COUNT и OFFSET"""
+    page_size = 6
+    page_size_query_param = 'limit'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        position = self.cursor and self.cursor.position
+        ordering = _reverse_ordering(self.ordering) if reverse else (
+            self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(
+                self.get_keyset(queryset.model, ordering, position))
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > len(self.page)
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.next_position = self.previous_position = position
+        if self.page:
+            self.next_position = self._get_position_from_instance(
+                self.page[-1], self.ordering)
+            self.previous_position = self._get_position_from_instance(
+                self.page[0], self.ordering)
+
+        return self.page
+
+    def get_keyset(self, model, ordering, position):
+        """(a, b) после (x, y): a за x или a = x и b за y"""
+        values = position.split(POSITION_SEPARATOR)
+        if len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        keyset, equal = Q(), {}
+        for order, value in zip(ordering, values):
+            name = order.lstrip('-')
+            try:
+                value = model._meta.get_field(name).to_python(value)
+            except ValidationError:
+                raise NotFound(self.invalid_cursor_message)
+            lookup = 'lt' if order.startswith('-') else 'gt'
+            keyset |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+
+        return keyset
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=False, position=self.next_position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=True, position=self.previous_position))
+
+    def _get_position_from_instance(self, instance, ordering):
+        names = [order.lstrip('-') for order in ordering]
+        if isinstance(instance, dict):
+            values = [instance[name] for name in names]
+        else:
+            values = [getattr(instance, name) for name in names]
+
+        return POSITION_SEPARATOR.join(map(str, values))
+
+
+class RecipesCursorPagination(KeysetCursorPagination):
+    ordering = ('-created', '-id')
+
+
+class SubscriptionsCursorPagination(KeysetCursorPagination):
+    ordering = ('id',)
+
+
+class TimelineCursorPagination(KeysetCursorPagination):
+    """Лента подписок: страница читается по индексу (user, -created)"""
+    ordering = ('-created', '-recipe_id')
 
 
 class CustomPagination(PageNumberPagination):
+    """Постраничная пагинация, с ?cursor= - курсорная"""
     page_size = 6
     page_size_query_param = 'limit'
+    cursor_pagination_class = None
+
+    def use_cursor(self, request):
+
+        return (self.cursor_pagination_class is not None
+                and 'cursor' in request.query_params)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if self.use_cursor(request):
+            self.cursor_paginator = self.cursor_pagination_class()
+
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+
+            return self.cursor_paginator.get_paginated_response(data)
+
+        return super().get_paginated_response(data)
+
+    def get_state(self):
+        """Состояние страницы помимо объектов - для ETag"""
+        if self.cursor_paginator is not None:
+
+            return (self.cursor_paginator.has_next,
+                    self.cursor_paginator.has_previous)
+
+        return self.page.paginator.count
+
+
+class RecipesPagination(CustomPagination):
+    cursor_pagination_class = RecipesCursorPagination
+
+    def use_cursor(self, request):
+        """У ?ordering= и ?search= своя сортировка - только ?page="""
+
+        return (super().use_cursor(request)
+                and not {'ordering', 'search'} & set(request.query_params))
+
+
+class SubscriptionsPagination(CustomPagination):
+    cursor_pagination_class = SubscriptionsCursorPagination
+
+
+def get_recipes_limit(request):
+    """Сколько рецептов показывать у каждого автора (?recipes_limit=)"""
+    try:
+        limit = int(request.query_params.get('recipes_limit'))
+    except (TypeError, ValueError):
+
+        return RECIPES_LIMIT
+
+    return limit if limit > 0 else RECIPES_LIMIT
+
+
+def get_trending_limit(request):
+    """Сколько рецептов в тренде показать (?limit=)"""
+    try:
+        limit = int(request.query_params.get('limit'))
+    except (TypeError, ValueError):
+
+        return TRENDING_DEFAULT_LIMIT
+    if limit <= 0:
+
+        return TRENDING_DEFAULT_LIMIT
+
+    return min(limit, settings.TRENDING_LIMIT)
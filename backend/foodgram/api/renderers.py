@@ -0,0 +1,132 @@
+import csv
+import json
+from abc import ABC, abstractmethod
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class ShoppingCartRenderer(ABC, BaseRenderer):
+    """Базовый класс потоковой выгрузки списка покупок"""
+    charset = 'utf-8'
+    # Конец файла; пустой кусок не отдаём - серверу он может
+    # показаться концом ответа
+    tail = ''
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Ответы с ошибками (401 и т.п.) приходят сюда словарём"""
+
+        return '\n'.join(f'{key}: {value}' for key, value in data.items())
+
+    @abstractmethod
+    def head(self, user):
+        """Начало файла"""
+
+    @abstractmethod
+    def line(self, ingredient, first):
+        """ingredient - кортеж (название, ед. изм., количество)"""
+
+    def stream(self, ingredients, user):
+        yield self.head(user)
+        first = True
+        for ingredient in ingredients:
+            yield self.line(ingredient, first)
+            first = False
+        if self.tail:
+            yield self.tail
+
+    async def astream(self, ingredients, user):
+        yield self.head(user)
+        first = True
+        async for ingredient in ingredients:
+            yield self.line(ingredient, first)
+            first = False
+        if self.tail:
+            yield self.tail
+
+
+class TextShoppingCartRenderer(ShoppingCartRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def head(self, user):
+
+        return f'Я {user}\nИ это мой список покупок:\n \n'
+
+    def line(self, ingredient, first):
+        name, measure, amount = ingredient
+
+        return f'{name}: {amount} {measure} \n'
+
+
+class Echo:
+    """Псевдо-файл для csv.writer: возвращает строку вместо записи"""
+    def write(self, value):
+
+        return value
+
+
+class CSVShoppingCartRenderer(ShoppingCartRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    writer = csv.writer(Echo())
+
+    def head(self, user):
+
+        return self.writer.writerow(('name', 'measurement_unit', 'amount'))
+
+    def line(self, ingredient, first):
+
+        return self.writer.writerow(ingredient)
+
+
+class JSONShoppingCartRenderer(ShoppingCartRenderer):
+    media_type = 'application/json'
+    format = 'json'
+    tail = ']'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+
+        return json.dumps(data, ensure_ascii=False)
+
+    def head(self, user):
+
+        return '['
+
+    def line(self, ingredient, first):
+        name, measure, amount = ingredient
+
+        return ('' if first else ',') + json.dumps({
+            'name': name,
+            'measurement_unit': measure,
+            'amount': amount,
+        }, ensure_ascii=False)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer на orjson; числа с порядком пишет иначе: 1e16, не 1e+16"""
+
+    def __init__(self):
+        if orjson is None:
+            raise ImproperlyConfigured(
+                'Для ORJSONRenderer нужен пакет orjson')
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(
+            data, default=self.encoder_class().default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+
+        # Как и DRF, экранируем U+2028 и U+2029 для совместимости с JS
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+            b'\xe2\x80\xa9', b'\\u2029')
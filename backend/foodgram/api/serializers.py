@@ -1,23 +1,48 @@
 from django.contrib.auth import get_user_model
-from django.core.paginator import Paginator
-from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.utils.functional import cached_property
 from djoser.serializers import (UserCreateSerializer, UserSerializer,
                                 ValidationError)
 from rest_framework import serializers
-from rest_framework.relations import SlugRelatedField
+from rest_framework.relations import PrimaryKeyRelatedField, SlugRelatedField
 from rest_framework.serializers import (CurrentUserDefault, ModelSerializer,
                                         SerializerMethodField)
 
+from recipes import shopping_list, timeline
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+                            RecipeTag, ShoppingCart, SimilarRecipe, Tag)
 from users.models import Subscribe
+from .lean import LeanSerializerMixin, file_url
+from .pagination import get_recipes_limit
 from .utils_serializers import Base64ImageField, Hex2NameColor
+from .viewer_state import get_viewer_state
 
 
 User = get_user_model()
 
+BULK_RECIPES_LIMIT = 100
 
-class TagSerializer(ModelSerializer):
+
+def check_ids(ids, model, duplicate_message):
+    """Ошибки по позициям списка id: повторы и отсутствующие в базе"""
+    existing = set(model.objects.filter(
+        id__in=set(ids)).values_list('id', flat=True))
+    does_not_exist = PrimaryKeyRelatedField.default_error_messages[
+        'does_not_exist']
+    errors = {}
+    seen = set()
+    for index, pk in enumerate(ids):
+        if pk in seen:
+            errors[index] = [duplicate_message]
+        elif pk not in existing:
+            errors[index] = [does_not_exist.format(pk_value=pk)]
+        seen.add(pk)
+
+    return errors
+
+
+class TagSerializer(LeanSerializerMixin, ModelSerializer):
     color = Hex2NameColor()
 
     class Meta:
@@ -25,13 +50,13 @@ class TagSerializer(ModelSerializer):
         fields = '__all__'
 
 
-class IngredientSerializer(ModelSerializer):
+class IngredientSerializer(LeanSerializerMixin, ModelSerializer):
     class Meta:
         model = Ingredient
         fields = '__all__'
 
 
-class AuthorRecipesSerializer(ModelSerializer):
+class AuthorRecipesSerializer(LeanSerializerMixin, ModelSerializer):
     """Сериализ. автора для добавления в рецепты"""
     is_subscribed = SerializerMethodField(read_only=True)
 
@@ -42,17 +67,14 @@ class AuthorRecipesSerializer(ModelSerializer):
 
     def get_is_subscribed(self, obj):
         """Есть ли подписка на этого автора"""
-        user = self.context['request'].user
-        if user.is_anonymous:
-            return False
-        return Subscribe.objects.filter(
-            user=user, author=obj).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return get_viewer_state(self.context).is_subscribed(obj)
 
 
 class IngredientAmountSerializer(serializers.Serializer):
     """Сериализ. для добавления amount в ингредиенты"""
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(),)
+    id = serializers.IntegerField(min_value=1,)
     amount = serializers.IntegerField(min_value=1,)
 
 
@@ -63,16 +85,15 @@ class IngredientInRecipeSerializer(ModelSerializer):
         fields = ('amount',)
 
     def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        representation['id'] = instance.ingredient.id
-        representation['name'] = instance.ingredient.name
-        representation['measurement_unit'] = (
-            instance.ingredient.measurement_unit)
+        ingredient = instance.ingredient
 
-        return representation
+        return {'amount': int(instance.amount),
+                'id': ingredient.id,
+                'name': ingredient.name,
+                'measurement_unit': ingredient.measurement_unit}
 
 
-class ReadRecipesSerializer(ModelSerializer):
+class ReadRecipesSerializer(LeanSerializerMixin, ModelSerializer):
     """Сериализ. для чтения рецептов"""
     is_favorited = SerializerMethodField(read_only=True)
     is_in_shopping_cart = SerializerMethodField(read_only=True)
@@ -87,40 +108,57 @@ class ReadRecipesSerializer(ModelSerializer):
                   'is_favorited', 'is_in_shopping_cart',
                   'name', 'image', 'text', 'cooking_time',)
 
+    def to_representation(self, obj):
+        if hasattr(obj, 'author_is_subscribed'):
+            obj.author.is_subscribed = obj.author_is_subscribed
+
+        return super().to_representation(obj)
+
     def get_image(self, obj):
 
-        return str(obj.image.url)
+        return str(file_url(obj.image))
+
+    @cached_property
+    def ingredient_serializer(self):
+        """Один на весь список рецептов, а не новый на каждый рецепт"""
+
+        return IngredientInRecipeSerializer()
 
     def get_ingredients(self, obj):
-        queryset = RecipeIngredient.objects.filter(recipe=obj)
+        to_representation = self.ingredient_serializer.to_representation
 
-        return IngredientInRecipeSerializer(queryset, many=True).data
+        return [to_representation(recipe_ingredient) for recipe_ingredient
+                in obj.recipeingredient_set.all()]
 
     def get_is_favorited(self, obj):
         """Добавлен ли рецепт в список избранного"""
-        user = self.context['request'].user
-        if user.is_anonymous:
+        if hasattr(obj, 'is_favorited'):
 
-            return False
+            return obj.is_favorited
 
-        return Favorite.objects.filter(user_id=user.pk,
-                                       recipe_id=obj.pk).exists()
+        return get_viewer_state(self.context).is_favorited(obj)
 
     def get_is_in_shopping_cart(self, obj):
         """Добавлен ли рецепт в список покупок"""
-        user = self.context['request'].user
-        if user.is_anonymous:
+        if hasattr(obj, 'is_in_shopping_cart'):
+
+            return obj.is_in_shopping_cart
+
+        return get_viewer_state(self.context).is_in_shopping_cart(obj)
+
 
-            return False
+class CookableRecipeSerializer(ReadRecipesSerializer):
+    """Сериализ. рецептов, подобранных по имеющимся ингредиентам"""
+    missing = serializers.IntegerField(read_only=True)
 
-        return ShoppingCart.objects.filter(user_id=user.id,
-                                           recipe_id=obj.pk).exists()
+    class Meta(ReadRecipesSerializer.Meta):
+        fields = ReadRecipesSerializer.Meta.fields + ('missing',)
 
 
 class RecipeSerializer(ModelSerializer):
     """Сериалайзер для модели рецепта: создание и обновление"""
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True,)
+    tags = serializers.ListField(
+        child=serializers.IntegerField(min_value=1,),)
     author = AuthorRecipesSerializer(read_only=True)
     ingredients = IngredientAmountSerializer(many=True)
     image = Base64ImageField()
@@ -130,56 +168,99 @@ class RecipeSerializer(ModelSerializer):
         fields = ('name', 'tags', 'ingredients',
                   'cooking_time', 'text', 'image', 'author')
 
-    def create_ingredients(self, recipe, ingredients):
-        recipes_ingredients = (RecipeIngredient(
-            recipe=recipe,
-            ingredient_id=ingredient['id'].pk,
-            amount=ingredient['amount']) for ingredient in ingredients)
-
-        return RecipeIngredient.objects.bulk_create(recipes_ingredients)
-
+    def set_tags(self, recipe, tags, created=False):
+        """Удаляет и добавляет только изменившиеся тэги"""
+        new = set(tags)
+        old = set() if created else set(RecipeTag.objects.filter(
+            recipe=recipe).values_list('tag_id', flat=True))
+        if old - new:
+            RecipeTag.objects.filter(
+                recipe=recipe, tag_id__in=old - new).delete()
+        if new - old:
+            RecipeTag.objects.bulk_create(
+                RecipeTag(recipe=recipe, tag_id=tag_id)
+                for tag_id in new - old)
+
+    def set_ingredients(self, recipe, new, current):
+        """Привести ингредиенты рецепта current к new"""
+        removed = current.keys() - new.keys()
+        changed = [RecipeIngredient(id=current[pk].id, amount=amount)
+                   for pk, amount in new.items()
+                   if pk in current and current[pk].amount != amount]
+        added = [RecipeIngredient(recipe=recipe, ingredient_id=pk,
+                                  amount=amount)
+                 for pk, amount in new.items() if pk not in current]
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        if added:
+            RecipeIngredient.objects.bulk_create(added)
+
+    def get_amounts(self, ingredients):
+
+        return {ingredient['id']: ingredient['amount']
+                for ingredient in ingredients}
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
-        for tag in tags:
-            recipe.tags.add(tag)
-        self.create_ingredients(recipe, ingredients)
+        self.set_tags(recipe, tags, created=True)
+        self.set_ingredients(recipe, self.get_amounts(ingredients), {})
+        timeline.fan_out(recipe)
 
         return recipe
 
     def to_representation(self, obj):
+        prefetch_related_objects(
+            [obj], 'tags', Prefetch(
+                'recipeingredient_set',
+                RecipeIngredient.objects.select_related('ingredient')))
 
         return ReadRecipesSerializer(
             obj, context={'request': self.context.get('request')}).data
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
+        current = {recipe_ingredient.ingredient_id: recipe_ingredient
+                   for recipe_ingredient in RecipeIngredient.objects.filter(
+                       recipe=instance).only('id', 'ingredient_id', 'amount')}
+        new = self.get_amounts(ingredients)
+        changed = new != {pk: item.amount for pk, item in current.items()}
+        if changed:
+            shopping_list.subtract_recipe(instance.id)
         instance = super().update(instance, validated_data)
-        instance.tags.clear()
-        instance.ingredients.clear()
-        for tag in tags:
-            instance.tags.add(tag)
-        self.create_ingredients(instance, ingredients)
+        self.set_tags(instance, tags)
+        self.set_ingredients(instance, new, current)
+        if changed:
+            shopping_list.add_recipe(instance.id)
 
         return instance
 
-    def validate(self, data):
-        """Проверка: отсутствие в рецепте
-        повторяющихся ингредиентов и тэгов"""
-        tags_ingredients = []
-        for ingredient in data['ingredients']:
-            if ingredient in tags_ingredients:
-                raise ValidationError(
-                    {'Error': 'Вы уже добавляли этот ингредиент'})
-            tags_ingredients.append(ingredient)
-        for tag in data['tags']:
-            if tag in tags_ingredients:
-                raise ValidationError({'Error': 'Вы уже добавляли этот тэг'})
-            tags_ingredients.append(tag)
+    def validate_ingredients(self, ingredients):
+        """Проверка: ингредиенты существуют и не повторяются"""
+        errors = check_ids(
+            [ingredient['id'] for ingredient in ingredients], Ingredient,
+            'Вы уже добавляли этот ингредиент')
+        if errors:
+            raise ValidationError([
+                {'id': errors[index]} if index in errors else {}
+                for index in range(len(ingredients))])
+
+        return ingredients
+
+    def validate_tags(self, tags):
+        """Проверка: тэги существуют и не повторяются"""
+        errors = check_ids(tags, Tag, 'Вы уже добавляли этот тэг')
+        if errors:
+            raise ValidationError(errors)
 
-        return data
+        return tags
 
 
 class ShoppingCartSerializer(ModelSerializer):
@@ -190,25 +271,6 @@ class ShoppingCartSerializer(ModelSerializer):
         model = ShoppingCart
         fields = ('recipe',)
 
-    def validate(self, data):
-        request = self.context['request']
-        user = request.user
-        recipe_id = self.context.get('view').kwargs.get('obj_id')
-        recipe = get_object_or_404(Recipe, pk=recipe_id)
-        mod = ShoppingCart.objects.filter(
-            recipe_id=recipe.id,
-            user_id=user)
-        if request.method == 'POST':
-            if mod:
-                raise serializers.ValidationError(
-                    'Вы уже добавляли этот рецепт в список покупок')
-        if request.method == 'DELETE':
-            if not mod:
-                raise serializers.ValidationError(
-                    'Вы пытаетесь удалить отсутствующий в списке рецепт')
-
-        return data
-
 
 class FavoriteSerializer(ModelSerializer):
     """Сериализ. для добавления в избранное"""
@@ -219,34 +281,54 @@ class FavoriteSerializer(ModelSerializer):
         fields = ('id', 'recipe',)
         read_only_fields = ('id',)
 
-    def validate(self, data):
-        request = self.context['request']
-        recipe_id = self.context.get('view').kwargs.get('obj_id')
-        recipe = get_object_or_404(Recipe, pk=recipe_id)
-        mod = Favorite.objects.filter(user=request.user, recipe=recipe)
-        if request.method == 'POST':
-            if mod:
-                raise ValidationError(
-                    'Вы уже добавляли этот рецепт в список избранного')
-        if request.method == 'DELETE':
-            if not mod:
-                raise serializers.ValidationError(
-                    'Вы пытаетесь удалить отсутствующий в списке рецепт')
 
-        return data
+class BulkRecipesSerializer(serializers.Serializer):
+    """Сериализ. списка id рецептов для массовых корзины и избранного"""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1,),
+        max_length=BULK_RECIPES_LIMIT,)
+
+    def validate_recipes(self, recipes):
+        """Проверка: рецепты существуют и не повторяются"""
+        if not recipes and self.context['request'].method != 'PUT':
+            raise ValidationError('Список рецептов пуст')
+        errors = check_ids(recipes, Recipe, 'Этот рецепт уже указан')
+        if errors:
+            raise ValidationError(errors)
+
+        return recipes
 
 
-class UserRecipesSerializer(ModelSerializer):
+class UserRecipesSerializer(LeanSerializerMixin, ModelSerializer):
     """Сериализ. с рецептами для модели кастомного юзера"""
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time', )
 
 
-class CustomUserSerializer(UserSerializer):
+class SimilarRecipeSerializer(ModelSerializer):
+    """Сериализ. похожего рецепта: краткий рецепт и близость"""
+    class Meta:
+        model = SimilarRecipe
+        fields = ('score',)
+
+    @cached_property
+    def recipe_serializer(self):
+
+        return UserRecipesSerializer(context=self.context)
+
+    def to_representation(self, instance):
+        representation = self.recipe_serializer.to_representation(
+            instance.similar)
+        representation['score'] = instance.score
+
+        return representation
+
+
+class CustomUserSerializer(LeanSerializerMixin, UserSerializer):
     """Сериализ. кастомного юзера(переопред. Djoser)"""
     recipes = SerializerMethodField('paginated_recipes')
-    recipes_count = SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
     is_subscribed = SerializerMethodField()
 
     class Meta:
@@ -254,31 +336,30 @@ class CustomUserSerializer(UserSerializer):
         fields = ('id', 'email', 'username', 'first_name',
                   'last_name', 'is_subscribed', 'recipes', 'recipes_count',)
 
+    @cached_property
+    def recipe_serializer(self):
+        """Без контекста: картинки рецептов автора - относительные URL"""
+
+        return UserRecipesSerializer(read_only=True)
+
     def paginated_recipes(self, obj):
-        """Пагинация внутри поля рецептов"""
-        page_size = self.context['request'].query_params.get(
-            'recipes_limit'
-        ) or 3
-        paginator = Paginator(obj.recipes.all(), page_size)
-        page = self.context['request'].query_params.get('page') or 1
-        recipes = paginator.page(page)
-        serializer = UserRecipesSerializer(recipes, many=True, read_only=True)
+        """Первые recipes_limit рецептов автора"""
+        if hasattr(obj, 'limited_recipes'):
+            recipes = obj.limited_recipes
+        else:
+            recipes = obj.recipes.all()[
+                :get_recipes_limit(self.context['request'])]
+        to_representation = self.recipe_serializer.to_representation
 
-        return serializer.data
+        return [to_representation(recipe) for recipe in recipes]
 
     def get_is_subscribed(self, obj):
         """Есть ли подписка на этого автора"""
-        user = self.context['request'].user
-        if user.is_anonymous:
-
-            return False
+        if hasattr(obj, 'is_subscribed'):
 
-        return Subscribe.objects.filter(
-            user=user, author=obj).exists()
+            return obj.is_subscribed
 
-    def get_recipes_count(self, obj):
-
-        return Recipe.objects.filter(author=obj).count()
+        return get_viewer_state(self.context).is_subscribed(obj)
 
 
 class CustomUserCreateSerializer(UserCreateSerializer):
@@ -316,22 +397,3 @@ class SubscribeSerializer(ModelSerializer):
             raise ValidationError('На себя нельзя подписаться')
 
         return value
-
-    def validate(self, data):
-        request = self.context['request']
-        author_id = self.context.get('view').kwargs.get('obj_id')
-        author = get_object_or_404(User, pk=author_id)
-        subscribe = Subscribe.objects.filter(
-            user=request.user, author=author)
-        if not author:
-            raise ValidationError('Такого автора не существует')
-        if request.method == 'POST':
-            if subscribe:
-                raise ValidationError(
-                    'Вы уже подписаны на этого автора.')
-        if request.method == 'DELETE':
-            if not subscribe:
-                raise ValidationError(
-                    'Вы не были подписаны на данного автора')
-
-        return data
@@ -0,0 +1,43 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from recipes import counters, similarity
+from recipes.models import Ingredient, Recipe, Tag
+from .cache import bump_version
+from .cookable_index import cookable_index
+from .ingredient_index import ingredient_index
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    """Версия индекса ингредиентов повышается после коммита"""
+    transaction.on_commit(ingredient_index.invalidate)
+    transaction.on_commit(cookable_index.invalidate)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_cookable_index(sender, **kwargs):
+    """Версия индекса подбора рецептов повышается после коммита"""
+    transaction.on_commit(cookable_index.invalidate)
+
+
+@receiver(post_save, sender=Recipe)
+def count_created_recipe(sender, instance, created, **kwargs):
+    if created:
+        counters.change(Recipe, [instance.author_id], 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def count_deleted_recipe(sender, instance, **kwargs):
+    counters.change(Recipe, [instance.author_id], -1)
+
+
+@receiver(pre_delete, sender=Recipe)
+def mark_similar_neighbours(sender, instance, **kwargs):
+    similarity.mark_neighbours(instance.id)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(sender, **kwargs):
+    transaction.on_commit(lambda: bump_version('tags'))
@@ -0,0 +1,449 @@
+import json
+from collections import Counter
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.fields import FloatField
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.serializers import ModelSerializer
+from rest_framework.test import APIClient, APIRequestFactory
+
+from recipes import counters, trending
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTag, ShoppingCart, SimilarityChange,
+                            SimilarRecipe, Tag, TrendingScore)
+from users.models import Subscribe
+
+from .renderers import ORJSONRenderer
+from .serializers import SimilarRecipeSerializer, UserRecipesSerializer
+
+
+User = get_user_model()
+
+# Бюджет запросов, не зависящий от размера страницы:
+# COUNT, рецепты с автором и флагами, тэги, ингредиенты
+LIST_QUERIES = 4
+# рецепт с автором и флагами, тэги, ингредиенты
+DETAIL_QUERIES = 3
+
+
+class RecipeQueryCountTest(TestCase):
+    """Список и рецепт читаются за фиксированное число запросов (N+1)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        authors = [User.objects.create_user(
+            username=f'author{number}', email=f'author{number}@example.com',
+            password='pass') for number in range(3)]
+        tags = Tag.objects.bulk_create(
+            Tag(name=f'тэг {number}', color=f'#00000{number}',
+                slug=f'tag{number}') for number in range(3))
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+            for number in range(10))
+        recipes = Recipe.objects.bulk_create(
+            Recipe(name=f'рецепт {number}', author=authors[number % 3],
+                   image='recipe/images/test.png', text='текст',
+                   cooking_time=10) for number in range(210))
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag=tag)
+            for recipe in recipes for tag in tags[:2])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=2)
+            for recipe in recipes for ingredient in ingredients[:3])
+        Favorite.objects.bulk_create(
+            Favorite(user=cls.user, recipe=recipe) for recipe in recipes[::2])
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=cls.user, recipe=recipe)
+            for recipe in recipes[::3])
+        Subscribe.objects.create(user=cls.user, author=authors[0])
+        cls.recipe = recipes[0]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.anonymous = APIClient()
+
+    def test_list_queries_do_not_depend_on_page_size(self):
+        for client in (self.client, self.anonymous):
+            for limit in (6, 50, 200):
+                with self.subTest(limit=limit, user=client is self.client):
+                    with self.assertNumQueries(LIST_QUERIES):
+                        response = client.get(
+                            '/api/recipes/', {'limit': limit})
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(len(response.data['results']), limit)
+
+    def test_detail_queries(self):
+        for client in (self.client, self.anonymous):
+            with self.subTest(user=client is self.client):
+                with self.assertNumQueries(DETAIL_QUERIES):
+                    response = client.get(f'/api/recipes/{self.recipe.id}/')
+                self.assertEqual(response.status_code, 200)
+
+
+class RecipeSearchTest(TestCase):
+    """Новый и изменённый рецепт находятся через ?search="""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+
+    def search(self, text):
+        response = APIClient().get('/api/recipes/', {'search': text})
+        self.assertEqual(response.status_code, 200)
+
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_created_and_edited_recipe_is_found(self):
+        recipe = Recipe.objects.create(
+            name='Борщ украинский', author=self.author,
+            image='recipe/images/test.png', text='Свёкла и капуста',
+            cooking_time=90)
+        self.assertEqual(self.search('борщ'), [recipe.id])
+
+        recipe.name = 'Солянка сборная'
+        recipe.save()
+        self.assertEqual(self.search('солянка'), [recipe.id])
+        self.assertEqual(self.search('борщ'), [])
+
+        recipe.delete()
+        self.assertEqual(self.search('солянка'), [])
+
+
+class RecipeCursorPaginationTest(TestCase):
+    """Курсор проходит рецепты с одинаковым created без пропусков"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        Recipe.objects.bulk_create(
+            Recipe(name=f'рецепт {number}', author=author,
+                   image='recipe/images/test.png', text='текст',
+                   cooking_time=10) for number in range(25))
+        Recipe.objects.update(created=timezone.now())
+        cls.expected = list(Recipe.objects.order_by(
+            '-created', '-id').values_list('id', flat=True))
+
+    def walk(self, url, link):
+        ids = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            for query in queries:
+                self.assertNotIn('OFFSET', query['sql'])
+            ids.append([recipe['id'] for recipe in response.data['results']])
+            url = response.data[link]
+
+        return ids
+
+    def test_pages_forward_and_back(self):
+        pages = self.walk('/api/recipes/?cursor=&limit=7', 'next')
+        self.assertEqual(sum(pages, []), self.expected)
+        self.assertEqual([len(page) for page in pages], [7, 7, 7, 4])
+
+        last = self.client.get('/api/recipes/?cursor=&limit=7')
+        for _ in range(3):
+            last = self.client.get(last.data['next'])
+        back = self.walk(last.data['previous'], 'previous')
+        self.assertEqual(back, pages[-2::-1])
+
+
+class ShoppingListTest(TestCase):
+    """Список покупок совпадает с корзинами после каждого изменения"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='cook', email='cook@example.com', password='pass')
+        cls.other = User.objects.create_user(
+            username='other', email='other@example.com', password='pass')
+        cls.tag = Tag.objects.create(name='обед', color='#000000',
+                                     slug='lunch')
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+            for number in range(4))
+        cls.recipes = Recipe.objects.bulk_create(
+            Recipe(name=f'рецепт {number}', author=cls.user,
+                   image='recipe/images/test.png', text='текст',
+                   cooking_time=10) for number in range(3))
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                             amount=10 * (number + 1))
+            for number, recipe in enumerate(cls.recipes)
+            for ingredient in cls.ingredients[number:number + 2])
+        ShoppingCart.objects.create(user=cls.other, recipe=cls.recipes[0])
+        call_command('reconcile_shopping_lists', stdout=StringIO())
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assert_shopping_list(self):
+        call_command('reconcile_shopping_lists', check=True,
+                     stdout=StringIO())
+        expected = Counter()
+        for item in RecipeIngredient.objects.filter(
+                recipe__shopping_recipe__user=self.user).select_related(
+                    'ingredient'):
+            expected[item.ingredient.name] += item.amount
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/', {'format': 'json'})
+        self.assertEqual(response.status_code, 200)
+        downloaded = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(
+            {item['name']: item['amount'] for item in downloaded},
+            dict(expected))
+
+    def test_cart_toggles(self):
+        first, second, third = (recipe.id for recipe in self.recipes)
+        response = self.client.post(f'/api/recipes/{first}/shopping_cart/')
+        self.assertEqual(response.status_code, 201)
+        self.assert_shopping_list()
+
+        response = self.client.post(
+            '/api/recipes/shopping_cart/', {'recipes': [first, second, third]},
+            format='json')
+        self.assertEqual(response.data['added'], [second, third])
+        self.assert_shopping_list()
+
+        response = self.client.put(
+            '/api/recipes/shopping_cart/', {'recipes': [second]},
+            format='json')
+        self.assertEqual(sorted(response.data['removed']), [first, third])
+        self.assert_shopping_list()
+
+        response = self.client.delete(f'/api/recipes/{second}/shopping_cart/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_shopping_list()
+
+        response = self.client.delete(
+            '/api/recipes/shopping_cart/', {'recipes': [first, second]},
+            format='json')
+        self.assertEqual(response.data['removed'], [])
+        self.assert_shopping_list()
+
+    def test_recipe_edit_and_delete(self):
+        recipe = self.recipes[0]
+        self.client.post(
+            '/api/recipes/shopping_cart/',
+            {'recipes': [recipe.id, self.recipes[1].id]}, format='json')
+        response = self.client.patch(f'/api/recipes/{recipe.id}/', {
+            'tags': [self.tag.id],
+            'ingredients': [{'id': self.ingredients[1].id, 'amount': 7},
+                            {'id': self.ingredients[3].id, 'amount': 5}],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assert_shopping_list()
+
+        response = self.client.delete(f'/api/recipes/{recipe.id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_shopping_list()
+
+
+class ToggleTest(TestCase):
+    """Коды ответов переключателей и разовое изменение счётчиков"""
+    # (путь, связь, счётчик рецепта)
+    TOGGLES = (
+        ('favorite', Favorite, 'favorites_count'),
+        ('shopping_cart', ShoppingCart, 'in_carts_count'),
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='cook', email='cook@example.com', password='pass')
+        cls.other = User.objects.create_user(
+            username='other', email='other@example.com', password='pass')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assert_state(self, field, count, score):
+        self.recipe.refresh_from_db()
+        self.assertEqual(getattr(self.recipe, field), count)
+        self.assertAlmostEqual(
+            TrendingScore.objects.get(recipe=self.recipe).score, score)
+
+    def test_toggles(self):
+        other = APIClient()
+        other.force_authenticate(self.other)
+        for path, model, field in self.TOGGLES:
+            with self.subTest(path=path):
+                self.recipe = Recipe.objects.create(
+                    name=path, author=self.other, text='текст',
+                    image='recipe/images/test.png', cooking_time=10)
+                url = f'/api/recipes/{self.recipe.id}/{path}/'
+                weight = trending.WEIGHTS[model]
+                self.assertEqual(other.post(url).status_code, 201)
+                self.assert_state(field, 1, weight)
+
+                self.assertEqual(self.client.post(url).status_code, 201)
+                self.assert_state(field, 2, 2 * weight)
+                self.assertEqual(self.client.post(url).status_code, 400)
+                self.assert_state(field, 2, 2 * weight)
+                response = self.client.post(
+                    f'/api/recipes/{path}/', {'recipes': [self.recipe.id]},
+                    format='json')
+                self.assertEqual(response.data['added'], [])
+                self.assert_state(field, 2, 2 * weight)
+
+                self.assertEqual(self.client.delete(url).status_code, 204)
+                self.assert_state(field, 1, weight)
+                self.assertEqual(self.client.delete(url).status_code, 400)
+                self.assert_state(field, 1, weight)
+
+                missing = f'/api/recipes/{self.recipe.id + 1000}/{path}/'
+                self.assertEqual(self.client.post(missing).status_code, 404)
+                self.assertEqual(self.client.delete(missing).status_code, 404)
+                self.assertFalse(model.objects.filter(user=self.user).exists())
+
+
+class CountersTest(TestCase):
+    """Денормализованные счётчики: сигналы и reconcile"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+
+    def create_recipe(self, number):
+
+        return Recipe.objects.create(
+            name=f'рецепт {number}', author=self.author, text='текст',
+            image='recipe/images/test.png', cooking_time=10)
+
+    def test_recipes_count_follows_create_and_delete(self):
+        recipes = [self.create_recipe(number) for number in range(3)]
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 3)
+
+        recipes[0].delete()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 2)
+
+    def test_reconcile_fixes_corrupted_counters(self):
+        recipe = self.create_recipe(0)
+        Favorite.objects.create(user=self.author, recipe=recipe)
+        User.objects.filter(pk=self.author.pk).update(recipes_count=42)
+        Recipe.objects.filter(pk=recipe.pk).update(favorites_count=5)
+
+        wrong = counters.reconcile(fix=False)
+        self.assertEqual(wrong['users.CustomUser', 'recipes_count'], 1)
+        self.assertEqual(wrong['recipes.Recipe', 'favorites_count'], 1)
+
+        counters.reconcile()
+        self.author.refresh_from_db()
+        recipe.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 1)
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertFalse(any(counters.reconcile(fix=False).values()))
+
+
+class SimilarRecipesTest(TestCase):
+    """--incremental даёт те же списки соседей, что и полный пересчёт"""
+
+    @classmethod
+    def setUpTestData(cls):
+        users = [User.objects.create_user(
+            username=f'user{number}', email=f'user{number}@example.com',
+            password='pass') for number in range(8)]
+        recipes = Recipe.objects.bulk_create(
+            Recipe(name=f'рецепт {number}', author=users[0],
+                   image='recipe/images/test.png', text='текст',
+                   cooking_time=10) for number in range(10))
+        Favorite.objects.bulk_create(
+            Favorite(user=user, recipe=recipe)
+            for number, user in enumerate(users)
+            for recipe in recipes[number:number + 4])
+        counters.reconcile()
+        cls.users, cls.recipes = users, recipes
+
+    def build(self, *args):
+        call_command('build_similar_recipes', '--top-k', '3', *args,
+                     stdout=StringIO())
+
+        return sorted(SimilarRecipe.objects.values_list(
+            'recipe_id', 'similar_id', 'score'))
+
+    def assert_incremental_matches_full(self):
+        self.assertTrue(SimilarityChange.objects.exists())
+        incremental = self.build('--incremental')
+        self.assertFalse(SimilarityChange.objects.exists())
+        self.assertEqual(incremental, self.build())
+
+    def test_favorite_toggles(self):
+        self.build()
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        client.post(f'/api/recipes/{self.recipes[8].id}/favorite/')
+        client.delete(f'/api/recipes/{self.recipes[1].id}/favorite/')
+        self.assert_incremental_matches_full()
+
+    def test_deleted_recipe(self):
+        self.build()
+        self.recipes[3].delete()
+        self.assert_incremental_matches_full()
+
+
+class LeanSerializerTest(TestCase):
+    """Облегчённое чтение и ORJSONRenderer против обычного пути DRF"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        recipes = Recipe.objects.bulk_create(
+            Recipe(name=f'рецепт {number}', author=author,
+                   image='recipe/images/test.png', text='текст',
+                   cooking_time=10) for number in range(3))
+        SimilarRecipe.objects.bulk_create([
+            SimilarRecipe(recipe=recipes[0], similar=recipes[1],
+                          score=1 / 3),
+            SimilarRecipe(recipe=recipes[0], similar=recipes[2],
+                          score=1e-05),
+        ])
+        cls.recipe = recipes[0]
+
+    def setUp(self):
+        self.request = Request(APIRequestFactory().get('/api/recipes/'))
+
+    def stock(self, serializer, instance):
+
+        return ModelSerializer.to_representation(serializer, instance)
+
+    def test_serializers_match_drf(self):
+        context = {'request': self.request}
+        recipe_serializer = UserRecipesSerializer(context=context)
+        similar_serializer = SimilarRecipeSerializer(context=context)
+        for similar in self.recipe.similar_recipes.select_related('similar'):
+            with self.subTest(score=similar.score):
+                lean = similar_serializer.to_representation(similar)
+                self.assertTrue(lean['image'].startswith('http://testserver/'))
+                self.assertEqual(lean, {
+                    **self.stock(recipe_serializer, similar.similar),
+                    'score': FloatField().to_representation(similar.score),
+                })
+
+    def test_orjson_renderer(self):
+        response = APIClient().get(f'/api/recipes/{self.recipe.id}/similar/')
+        data = response.data
+        stock = JSONRenderer().render(data)
+        fast = ORJSONRenderer().render(data)
+        self.assertEqual(json.loads(fast), json.loads(stock))
+        # Одинаковы байт в байт, кроме записи чисел с порядком
+        self.assertIn(b'"score":1e-05', stock)
+        self.assertIn(b'"score":0.00001', fast)
+        self.assertEqual(fast.replace(b'0.00001', b'1e-05'), stock)
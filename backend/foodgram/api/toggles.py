@@ -0,0 +1,73 @@
+"""Переключатели избранного, корзины и подписок одним запросом"""
+from django.db import connection, transaction
+
+from recipes import counters, similarity, trending
+
+
+INSERT_SQL = '''
+    INSERT INTO {table} ({user_column}, {target_column})
+    SELECT %s, target.{target_pk} FROM {target_table} target
+    WHERE target.{target_pk} IN ({targets})
+    ON CONFLICT DO NOTHING
+    RETURNING {target_column}
+'''
+
+DELETE_SQL = '''
+    DELETE FROM {table}
+    WHERE {user_column} = %s AND {target_column} IN ({targets})
+    RETURNING {target_column}
+'''
+
+
+def _execute(sql, model, target_field, user_id, target_ids):
+    target_ids = list(target_ids)
+    if not target_ids:
+        return []
+    field = model._meta.get_field(target_field)
+    target_meta = field.related_model._meta
+    sql = sql.format(
+        table=model._meta.db_table,
+        user_column=model._meta.get_field('user').column,
+        target_column=field.column,
+        target_table=target_meta.db_table,
+        target_pk=target_meta.pk.column,
+        targets=', '.join(['%s'] * len(target_ids)),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user_id, *target_ids])
+
+        return [target_id for target_id, in cursor.fetchall()]
+
+
+def add(model, target_field, user_id, target_id):
+    """Создать связь user -> target; False, если не создана"""
+
+    return bool(add_many(model, target_field, user_id, [target_id]))
+
+
+def remove(model, target_field, user_id, target_id):
+    """Удалить связь user -> target. False, если её не было."""
+
+    return bool(remove_many(model, target_field, user_id, [target_id]))
+
+
+@transaction.atomic
+def add_many(model, target_field, user_id, target_ids):
+    """Создать связи user -> target; id, для которых созданы"""
+    added = _execute(INSERT_SQL, model, target_field, user_id, target_ids)
+    counters.change(model, added, 1)
+    trending.record(model, added, 1)
+    similarity.mark(model, added)
+
+    return added
+
+
+@transaction.atomic
+def remove_many(model, target_field, user_id, target_ids):
+    """Удалить связи user -> target; id, для которых удалены"""
+    removed = _execute(DELETE_SQL, model, target_field, user_id, target_ids)
+    counters.change(model, removed, -1)
+    trending.record(model, removed, -1)
+    similarity.mark(model, removed)
+
+    return removed
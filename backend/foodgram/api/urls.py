@@ -4,7 +4,8 @@ from rest_framework.routers import DefaultRouter
 from . views import (RecipesViewSet, TagsViewSet,
                      IngredientsViewSet, ShoppingCartViewSet,
                      FavoriteViewSet, SubscriptionsViewSet,
-                     SubscribeViewSet)
+                     SubscribeViewSet, ShoppingCartBulkViewSet,
+                     FavoriteBulkViewSet)
 
 
 router = DefaultRouter()
@@ -23,8 +24,15 @@ router.register(r'users/subscriptions', SubscriptionsViewSet,
 router.register(r'users/(?P<obj_id>\d+)/subscribe', SubscribeViewSet,
                 basename='subscribe')
 
+bulk_actions = {'post': 'add', 'delete': 'remove', 'put': 'replace'}
+
 
 urlpatterns = [
+    path('recipes/shopping_cart/',
+         ShoppingCartBulkViewSet.as_view(bulk_actions),
+         name='recipes_shopping_cart_bulk'),
+    path('recipes/favorite/', FavoriteBulkViewSet.as_view(bulk_actions),
+         name='recipes_favorite_bulk'),
     path('', include(router.urls), name='api-root'),
     path(r'', include('djoser.urls')),
     path(r'auth/', include('djoser.urls.authtoken')),
@@ -0,0 +1,48 @@
+from django.utils.functional import cached_property
+
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscribe
+
+
+class ViewerState:
+    """Избранное, корзина и подписки текущего юзера"""
+    def __init__(self, user):
+        self.user = user
+
+    def _ids(self, queryset, field):
+        if self.user.is_anonymous:
+
+            return frozenset()
+
+        return frozenset(queryset.filter(
+            user_id=self.user.id).values_list(field, flat=True))
+
+    @cached_property
+    def favorite_ids(self):
+        return self._ids(Favorite.objects, 'recipe_id')
+
+    @cached_property
+    def shopping_cart_ids(self):
+        return self._ids(ShoppingCart.objects, 'recipe_id')
+
+    @cached_property
+    def subscribed_ids(self):
+        return self._ids(Subscribe.objects, 'author_id')
+
+    def is_favorited(self, recipe):
+        return recipe.pk in self.favorite_ids
+
+    def is_in_shopping_cart(self, recipe):
+        return recipe.pk in self.shopping_cart_ids
+
+    def is_subscribed(self, author):
+        return author.pk in self.subscribed_ids
+
+
+def get_viewer_state(context):
+    """Один ViewerState на запрос"""
+    request = context['request']
+    if not hasattr(request, 'viewer_state'):
+        request.viewer_state = ViewerState(request.user)
+
+    return request.viewer_state
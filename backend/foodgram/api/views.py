@@ -1,66 +1,264 @@
-from django.db.models import Sum
+from django.db.models import BooleanField, Exists, OuterRef, Prefetch, Value
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.http import HttpResponse
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
+from recipes import shopping_list, timeline, trending
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+                            ShoppingCart, ShoppingListItem, SimilarRecipe,
+                            Tag, TimelineEntry)
 from users.models import Subscribe
+from .cache import etag_matches, get_version, make_etag
+from .cookable_index import cookable_index
 from .filters import RecipeFilter, IngredientFilter
-from .mixins import CreateDestroyViewSet, ListRetrieveViewSet, ListViewSet
-from .pagination import CustomPagination
+from .ingredient_index import ingredient_index
+from .mixins import (AsyncViewMixin, BulkToggleViewSet,
+                     CreateDestroyViewSet, ListRetrieveViewSet, ListViewSet)
+from .pagination import (CustomPagination, RecipesPagination,
+                         SubscriptionsPagination, TimelineCursorPagination,
+                         get_recipes_limit, get_trending_limit)
+from .renderers import (CSVShoppingCartRenderer, JSONShoppingCartRenderer,
+                        TextShoppingCartRenderer)
 from .permissions import AuthorOrAdminOrReadOnly, ReadOrAdminOnly, IsAuthorOnly
-from .serializers import (CustomUserSerializer, FavoriteSerializer,
-                          IngredientSerializer, RecipeSerializer,
-                          ShoppingCartSerializer, SubscribeSerializer,
+from .serializers import (CookableRecipeSerializer, CustomUserSerializer,
+                          FavoriteSerializer, IngredientSerializer,
+                          ReadRecipesSerializer, RecipeSerializer,
+                          ShoppingCartSerializer,
+                          SimilarRecipeSerializer, SubscribeSerializer,
                           TagSerializer)
 
 
 User = get_user_model()
 
 
-class RecipesViewSet(ModelViewSet):
+async def aiter_rows(queryset, fields):
+    """Асинхронно - кортежи значений fields"""
+    # values_list().aiterator() в Django 4.2 блокирует событийный цикл
+    async for row in queryset.values(*fields).aiterator():
+        yield tuple(row[field] for field in fields)
+
+
+class RecipesViewSet(AsyncViewMixin, ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     permission_classes = (AuthorOrAdminOrReadOnly, )
     filter_backends = (DjangoFilterBackend, )
     filterset_class = RecipeFilter
+    pagination_class = RecipesPagination
+    lookup_value_regex = r'\d+'
+
+    def get_serializer_class(self):
+        """Список и рецепт читаются сразу ReadRecipesSerializer"""
+        if (self.action in ('list', 'retrieve')
+                and self.request.method in SAFE_METHODS):
+
+            return ReadRecipesSerializer
+
+        return super().get_serializer_class()
+
+    def get_queryset(self):
+        """Для чтения - автор, тэги, ингредиенты и флаги юзера заранее"""
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve', 'cookable', 'feed',
+                               'trending'):
+
+            return queryset
+
+        queryset = queryset.select_related('author').prefetch_related(
+            'tags',
+            Prefetch('recipeingredient_set',
+                     queryset=RecipeIngredient.objects.select_related(
+                         'ingredient')),
+        )
+        user = self.request.user
+        if user.is_anonymous:
+
+            return queryset
+
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user_id=user.id, recipe_id=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user_id=user.id, recipe_id=OuterRef('pk'))),
+            author_is_subscribed=Exists(Subscribe.objects.filter(
+                user_id=user.id, author_id=OuterRef('author_id'))),
+        )
+
+    def get_validators(self, recipes, *extra):
+        """ETag и Last-Modified рецептов, как их увидит текущий юзер"""
+        parts = [self.request.user.id, *extra]
+        for recipe in recipes:
+            author = recipe.author
+            parts += [recipe.id, recipe.updated.isoformat(),
+                      getattr(recipe, 'is_favorited', False),
+                      getattr(recipe, 'is_in_shopping_cart', False),
+                      getattr(recipe, 'author_is_subscribed', False),
+                      author.id, author.email, author.username,
+                      author.first_name, author.last_name]
+            parts += [(tag.id, tag.name, tag.color, tag.slug)
+                      for tag in recipe.tags.all()]
+            parts += [(item.ingredient_id, item.ingredient.name,
+                       item.ingredient.measurement_unit, item.amount)
+                      for item in recipe.recipeingredient_set.all()]
+        last_modified = max(
+            (recipe.updated for recipe in recipes), default=None)
+
+        return make_etag(repr(parts).encode()), last_modified
+
+    def conditional_response(self, recipes, get_data, *extra):
+        """Если If-None-Match совпал, отвечаем 304, не сериализуя рецепты"""
+        etag, last_modified = self.get_validators(recipes, *extra)
+        if etag_matches(self.request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = get_data()
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        patch_vary_headers(response, ('Authorization',))
+
+        return response
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(
+            self.filter_queryset(self.get_queryset()))
+
+        return self.conditional_response(
+            page, lambda: self.get_paginated_response(
+                self.get_serializer(page, many=True).data),
+            self.paginator.get_state())
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+
+        return self.conditional_response(
+            [instance], lambda: Response(self.get_serializer(instance).data))
 
     def perform_create(self, serializer):
 
         return serializer.save(author=self.request.user)
 
-    @action(detail=False, permission_classes=(IsAuthorOnly,))
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        shopping_list.subtract_recipe(instance.id)
+        instance.delete()
+
+    def get_ingredient_ids(self, param):
+        """id ингредиентов из ?param=1&param=2 (или ?param=1,2)"""
+        try:
+
+            return {int(value)
+                    for values in self.request.query_params.getlist(param)
+                    for value in values.split(',') if value}
+        except ValueError:
+            raise ValidationError({param: ['Ожидаются id ингредиентов']})
+
+    @action(detail=False, serializer_class=CookableRecipeSerializer,
+            pagination_class=CustomPagination)
+    def cookable(self, request):
+        """Что приготовить из ?ingredients=, без ?exclude="""
+        ingredients = self.get_ingredient_ids('ingredients')
+        if not ingredients:
+            raise ValidationError({'ingredients': ['Укажите ингредиенты']})
+        page = self.paginate_queryset(cookable_index.match(
+            ingredients, self.get_ingredient_ids('exclude')))
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _ in page])
+        found = []
+        for recipe_id, missing in page:
+            recipe = recipes.get(recipe_id)
+            if recipe is not None:
+                recipe.missing = missing
+                found.append(recipe)
+
+        return self.get_paginated_response(
+            self.get_serializer(found, many=True).data)
+
+    @action(detail=False, permission_classes=(IsAuthenticated,),
+            serializer_class=ReadRecipesSerializer,
+            pagination_class=TimelineCursorPagination)
+    def feed(self, request):
+        """Рецепты авторов, на которых подписан юзер, новые сначала"""
+        timeline.pull(request.user.id)
+        page = self.paginate_queryset(TimelineEntry.objects.filter(
+            user=request.user).only('created', 'recipe_id'))
+        recipes = self.get_queryset().in_bulk(
+            [entry.recipe_id for entry in page])
+        found = [recipes[entry.recipe_id] for entry in page
+                 if entry.recipe_id in recipes]
+
+        return self.get_paginated_response(
+            self.get_serializer(found, many=True).data)
+
+    @action(detail=False, serializer_class=ReadRecipesSerializer,
+            pagination_class=None)
+    def trending(self, request):
+        """Рецепты, которые сейчас чаще добавляют в избранное и корзину"""
+        ranked = trending.top()[:get_trending_limit(request)]
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _ in ranked])
+        found = [recipes[recipe_id] for recipe_id, _ in ranked
+                 if recipe_id in recipes]
+
+        return Response(self.get_serializer(found, many=True).data)
+
+    @action(detail=True, serializer_class=SimilarRecipeSerializer,
+            pagination_class=None)
+    def similar(self, request, pk=None):
+        """Кто добавил этот рецепт в избранное, добавлял и эти"""
+        similar = SimilarRecipe.objects.filter(
+            recipe_id=pk).select_related('similar')
+        data = self.get_serializer(similar, many=True).data
+        if not data:
+            get_object_or_404(Recipe, pk=pk)
+
+        return Response(data)
+
+    @action(detail=False, permission_classes=(IsAuthenticated,),
+            renderer_classes=(TextShoppingCartRenderer,
+                              CSVShoppingCartRenderer,
+                              JSONShoppingCartRenderer))
     def download_shopping_cart(self, request):
         """Дополнительный эндпойнт: загрузить список покупок"""
-        response = HttpResponse(content_type='text/plain')
+        renderer = request.accepted_renderer
+        fields = ('ingredient__name', 'ingredient__measurement_unit', 'amount')
+        ingredients = ShoppingListItem.objects.filter(
+            user=request.user
+        ).order_by('ingredient__name')
+        if isinstance(request._request, ASGIRequest):
+            content = renderer.astream(
+                aiter_rows(ingredients, fields), request.user)
+        else:
+            content = renderer.stream(
+                ingredients.values_list(*fields).iterator(), request.user)
+        response = StreamingHttpResponse(
+            content,
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
+        )
         response['Content-Disposition'] = (
-            'attachment;filename="shopping_cart.txt"'
+            f'attachment;filename="shopping_cart.{renderer.format}"'
         )
-        response.write(f'Я {request.user}\n')
-        response.write('И это мой список покупок:\n \n')
-
-        recipe_id = ShoppingCart.objects.values_list('recipe_id')
-        ingredients_list = RecipeIngredient.objects.filter(
-            recipe_id__in=recipe_id).values_list(
-            'ingredient__name', 'ingredient__measurement_unit').annotate(
-            Sum('amount'))
-        for ingredient in ingredients_list:
-            name = ingredient[0]
-            measure = ingredient[1]
-            amount = ingredient[2]
-            response.write(f'{name}: {amount} {measure} \n')
 
         return response
 
 
 class ShoppingCartViewSet(CreateDestroyViewSet):
     serializer_class = ShoppingCartSerializer
+    already_added_message = 'Вы уже добавляли этот рецепт в список покупок'
 
     def create(self, request, obj_id):
         return super().create(request, obj_id, ShoppingCart)
@@ -68,9 +266,46 @@ class ShoppingCartViewSet(CreateDestroyViewSet):
     def delete(self, request, obj_id):
         return super().delete(request, obj_id, ShoppingCart)
 
+    @transaction.atomic
+    def perform_add(self, obj_id, model):
+        added = super().perform_add(obj_id, model)
+        if added:
+            shopping_list.add_recipes([obj_id], self.request.user.id)
+
+        return added
+
+    @transaction.atomic
+    def perform_remove(self, obj_id, model):
+        """Вычитается, только если рецепт реально удалён из корзины"""
+        removed = super().perform_remove(obj_id, model)
+        if removed:
+            shopping_list.subtract_recipes([obj_id], self.request.user.id)
+
+        return removed
+
+
+class ShoppingCartBulkViewSet(BulkToggleViewSet):
+    model = ShoppingCart
+
+    @transaction.atomic
+    def perform_bulk_add(self, recipe_ids):
+        added = super().perform_bulk_add(recipe_ids)
+        shopping_list.add_recipes(added, self.request.user.id)
+
+        return added
+
+    @transaction.atomic
+    def perform_bulk_remove(self, recipe_ids):
+        """Вычитаются только рецепты, реально удалённые из корзины"""
+        removed = super().perform_bulk_remove(recipe_ids)
+        shopping_list.subtract_recipes(removed, self.request.user.id)
+
+        return removed
+
 
 class FavoriteViewSet(CreateDestroyViewSet):
     serializer_class = FavoriteSerializer
+    already_added_message = 'Вы уже добавляли этот рецепт в список избранного'
 
     def create(self, request, obj_id):
         return super().create(request, obj_id, Favorite)
@@ -79,14 +314,35 @@ class FavoriteViewSet(CreateDestroyViewSet):
         return super().delete(request, obj_id, Favorite)
 
 
-class TagsViewSet(ListRetrieveViewSet):
+class FavoriteBulkViewSet(BulkToggleViewSet):
+    model = Favorite
+
+
+class TagsViewSet(AsyncViewMixin, ListRetrieveViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (ReadOrAdminOnly, )
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        """Список тэгов из кэша, с ETag"""
+        key = f'tags:{get_version("tags")}'
+        cached = cache.get(key)
+        if cached is None:
+            data = self.get_serializer(self.get_queryset(), many=True).data
+            cached = (make_etag(JSONRenderer().render(data)), data)
+            cache.set(key, cached, timeout=settings.TAGS_CACHE_TTL)
+        etag, data = cached
+        if etag_matches(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+
+        return response
+
 
-class IngredientsViewSet(ListRetrieveViewSet):
+class IngredientsViewSet(AsyncViewMixin, ListRetrieveViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (ReadOrAdminOnly, )
@@ -95,16 +351,34 @@ class IngredientsViewSet(ListRetrieveViewSet):
     search_fields = ('^name',)
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        """?name= - из индекса в памяти, весь каталог - из .values()"""
+        name = request.query_params.get('name')
+        if name:
+
+            return Response(ingredient_index.search(name))
+
+        return Response(list(self.filter_queryset(
+            self.get_queryset()).values(*self.get_serializer().fields)))
+
 
 class SubscriptionsViewSet(ListViewSet):
     """Список авторов с рецептами, на котрых подписан юзер"""
     serializer_class = CustomUserSerializer
-    pagination_class = CustomPagination
+    pagination_class = SubscriptionsPagination
     permission_classes = (IsAuthorOnly, )
 
     def get_queryset(self):
+        """Первые recipes_limit рецептов авторов - одним запросом"""
+        recipes = Recipe.objects.all()[:get_recipes_limit(self.request)]
 
-        return User.objects.filter(following__user=self.request.user)
+        return User.objects.filter(
+            following__user=self.request.user
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='limited_recipes')
+        ).order_by('id')
 
 
 class SubscribeViewSet(CreateDestroyViewSet):
@@ -112,32 +386,29 @@ class SubscribeViewSet(CreateDestroyViewSet):
     serializer_class = SubscribeSerializer
     queryset = User.objects.all()
 
+    target_model = User
+    target_field = 'author'
+    already_added_message = 'Вы уже подписаны на этого автора.'
+    not_added_message = 'Вы не были подписаны на данного автора'
+
     def create(self, request, obj_id):
-        if request.user.is_authenticated:
-            author = get_object_or_404(User, pk=obj_id)
-            serializer = self.get_serializer(data=request.data)
-            serializer.is_valid(raise_exception=True)
-            Subscribe.objects.create(user=request.user, author=author)
+        return super().create(request, obj_id, Subscribe)
 
-            return Response({'Message': 'Добавление успешно'},
-                            status=status.HTTP_201_CREATED)
+    def delete(self, request, obj_id):
+        return super().delete(request, obj_id, Subscribe)
 
-        return Response({'Errors': 'Пожалуйста, пройдите авторизацию'},
-                        status=status.HTTP_401_UNAUTHORIZED)
+    @transaction.atomic
+    def perform_add(self, obj_id, model):
+        added = super().perform_add(obj_id, model)
+        if added:
+            timeline.backfill(self.request.user.id, obj_id)
 
-    def delete(self, request, obj_id):
-        if request.user.is_authenticated:
-            author = get_object_or_404(User, pk=obj_id)
-            serializer = self.get_serializer(data=request.data)
-            serializer.is_valid(raise_exception=True)
-            Subscribe.objects.filter(
-                author_id=author.id,
-                user_id=request.user.id).delete()
-
-            return Response({
-                'Message': 'Удаление успешно'},
-                status=status.HTTP_204_NO_CONTENT
-            )
-
-        return Response({'Errors': 'Пожалуйста, пройдите авторизацию'},
-                        status=status.HTTP_401_UNAUTHORIZED)
+        return added
+
+    @transaction.atomic
+    def perform_remove(self, obj_id, model):
+        removed = super().perform_remove(obj_id, model)
+        if removed:
+            timeline.trim(self.request.user.id, obj_id)
+
+        return removed
@@ -64,6 +64,10 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
+ASGI_APPLICATION = 'foodgram.asgi.application'
+
+# wsgi - синхронные воркеры gunicorn, asgi - воркеры uvicorn (foodgram.asgi)
+SERVER_MODE = os.getenv('SERVER_MODE', default='wsgi')
 
 DATABASES = {
     'default': {
@@ -76,6 +80,21 @@ DATABASES = {
     }
 }
 
+# Общий кэш воркеров; локальный годится только для разработки
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -128,8 +147,29 @@ REST_FRAMEWORK = {
 
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.CustomPagination',
     'PAGE_SIZE': 6,
+
+    'DEFAULT_RENDERER_CLASSES': [
+        os.getenv('JSON_RENDERER',
+                  default='rest_framework.renderers.JSONRenderer'),
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', default=50))
+TAGS_CACHE_TTL = int(os.getenv('TAGS_CACHE_TTL', default=300))
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', default=300))
+COOKABLE_INDEX_TTL = int(os.getenv('COOKABLE_INDEX_TTL', default=300))
+TIMELINE_FANOUT_LIMIT = int(os.getenv('TIMELINE_FANOUT_LIMIT', default=10000))
+TIMELINE_BACKFILL = int(os.getenv('TIMELINE_BACKFILL', default=100))
+TIMELINE_BATCH_SIZE = int(os.getenv('TIMELINE_BATCH_SIZE', default=1000))
+TRENDING_HALF_LIFE = float(os.getenv('TRENDING_HALF_LIFE', default=24))
+TRENDING_DECAY_MINUTES = int(os.getenv('TRENDING_DECAY_MINUTES', default=10))
+TRENDING_MIN_SCORE = float(os.getenv('TRENDING_MIN_SCORE', default=0.01))
+TRENDING_LIMIT = int(os.getenv('TRENDING_LIMIT', default=50))
+TRENDING_SNAPSHOT_TTL = int(os.getenv('TRENDING_SNAPSHOT_TTL', default=60))
+ADMIN_COUNT_ESTIMATE_FROM = int(
+    os.getenv('ADMIN_COUNT_ESTIMATE_FROM', default=100000))
+
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
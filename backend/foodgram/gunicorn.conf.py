@@ -0,0 +1,11 @@
+"""Настройки gunicorn: gunicorn -c gunicorn.conf.py"""
+import os
+
+
+bind = os.getenv('GUNICORN_BIND', default='0:8000')
+
+if os.getenv('SERVER_MODE', default='wsgi') == 'asgi':
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    wsgi_app = 'foodgram.asgi:application'
+else:
+    wsgi_app = 'foodgram.wsgi:application'
@@ -0,0 +1,57 @@
+"""Денормализованные счётчики популярности"""
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from users.models import Subscribe
+from .models import Favorite, Recipe, ShoppingCart
+
+
+User = get_user_model()
+
+# (модель, счётчик, связующая модель, поле связи, указывающее на модель)
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscribe, 'author'),
+)
+
+LINK_COUNTERS = {link: (model, field) for model, field, link, _ in COUNTERS}
+
+
+def change(link_model, target_ids, delta):
+    """Прибавить delta к счётчику link_model у объектов target_ids"""
+    target_ids = sorted(set(target_ids))
+    if not target_ids:
+        return
+    model, field = LINK_COUNTERS[link_model]
+    value = F(field) + delta
+    if delta < 0:
+        # Разошедшийся счётчик не должен уходить в минус
+        value = Greatest(value, 0)
+    model.objects.filter(pk__in=target_ids).update(**{field: value})
+
+
+def actual_count(link_model, link_field):
+    """Выражение: число связей, указывающих на строку внешнего запроса"""
+    links = link_model.objects.filter(
+        **{link_field: OuterRef('pk')}
+    ).order_by().values(link_field).annotate(count=Count('pk'))
+
+    return Coalesce(Subquery(links.values('count')), 0)
+
+
+def reconcile(fix=True):
+    """{(модель, счётчик): число неверных строк}; fix - пересчитать"""
+    wrong = {}
+    for model, field, link_model, link_field in COUNTERS:
+        actual = actual_count(link_model, link_field)
+        stale = model.objects.annotate(actual=actual).exclude(
+            **{field: F('actual')})
+        wrong[model._meta.label, field] = stale.count()
+        if fix and wrong[model._meta.label, field]:
+            model.objects.filter(
+                pk__in=stale.values('pk')).update(**{field: actual})
+
+    return wrong
@@ -0,0 +1,184 @@
+import time
+from collections import defaultdict
+from itertools import chain
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import (Favorite, Recipe, SimilarityChange,
+                            SimilarRecipe)
+
+
+class Command(BaseCommand):
+    help = ('Считает похожие рецепты по избранному ("кто добавил этот, '
+            'добавлял и эти"): косинусная близость столбцов разреженной '
+            'матрицы пользователь x рецепт, по --top-k соседей на рецепт. '
+            'С --incremental пересчитывает только рецепты из очереди '
+            'изменений и тех, на чью близость это влияет, читая избранное '
+            'только их пользователей. Нужны numpy и scipy.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=20)
+        parser.add_argument(
+            '--min-common', type=int, default=1,
+            help='Сколько общих пользователей нужно, чтобы считать '
+                 'рецепты похожими')
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Сколько рецептов обрабатывать за раз: от этого зависит '
+                 'расход памяти на произведение матриц')
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Пересчитать только рецепты из очереди изменений')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            import numpy
+            from scipy import sparse
+        except ImportError:
+            raise CommandError('Для расчёта нужны numpy и scipy')
+        self.np = numpy
+        self.options = options
+        started = time.monotonic()
+
+        changes = list(SimilarityChange.objects.values_list('id', 'recipe_id'))
+        targets = None
+        favorites = Favorite.objects.all()
+        if options['incremental']:
+            targets = self.get_targets({recipe for _, recipe in changes})
+            favorites = favorites.filter(user__in=Favorite.objects.filter(
+                recipe__in=list(targets)).values('user'))
+        users, recipes = self.load_favorites(favorites)
+        recipe_ids, columns = numpy.unique(recipes, return_inverse=True)
+        _, rows = numpy.unique(users, return_inverse=True)
+        matrix = sparse.csc_matrix(
+            (numpy.ones(len(rows), dtype=numpy.float32), (rows, columns)),
+            shape=(rows.max() + 1 if len(rows) else 0, len(recipe_ids)))
+        recipe_ids = recipe_ids.tolist()
+        norms = numpy.sqrt(self.get_counts(recipe_ids, columns))
+        self.stdout.write(
+            f'Избранное: {len(users)} строк, рецептов: {len(recipe_ids)}')
+
+        positions = {pk: position for position, pk in enumerate(recipe_ids)}
+        if targets is None:
+            targets = set(SimilarRecipe.objects.values_list(
+                'recipe_id', flat=True).distinct()) | positions.keys()
+        chunks = sorted(positions[pk] for pk in targets if pk in positions)
+        gone = targets - positions.keys()
+        transposed = matrix.T.tocsr()
+        chunk_size = options['chunk_size']
+        updated = 0
+        for start in range(0, len(chunks), chunk_size):
+            chunk = chunks[start:start + chunk_size]
+            products = (transposed @ matrix[:, chunk]).tocsc()
+            updated += self.save(recipe_ids, chunk, products, norms)
+        self.forget(gone)
+        self.delete_changes([pk for pk, _ in changes])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рецептов: {len(chunks)}, списков изменилось: '
+            f'{updated}, убрано: {len(gone)}, '
+            f'за {time.monotonic() - started:.1f} с'))
+
+    def load_favorites(self, favorites):
+        """Пары (user_id, recipe_id) в два массива numpy"""
+        rows = favorites.order_by().values_list('user_id', 'recipe_id')
+        pairs = self.np.fromiter(
+            chain.from_iterable(
+                rows.iterator(chunk_size=self.options['batch_size'])),
+            dtype=self.np.int64).reshape(-1, 2)
+
+        return pairs[:, 0], pairs[:, 1]
+
+    def get_targets(self, changed):
+        """Изменившиеся рецепты и все, чьи соседи могли измениться"""
+        users = Favorite.objects.filter(
+            recipe__in=list(changed)).values('user')
+        targets = set(changed)
+        targets.update(Favorite.objects.filter(user__in=users).values_list(
+            'recipe_id', flat=True).distinct())
+        targets.update(SimilarRecipe.objects.filter(
+            similar__in=list(changed)).values_list('recipe_id', flat=True))
+
+        return targets
+
+    def get_counts(self, recipe_ids, columns):
+        """Число добавлений в избранное по столбцам"""
+        counts = self.np.bincount(columns, minlength=len(recipe_ids))
+        if not self.options['incremental']:
+
+            return counts
+
+        stored = {}
+        batch_size = self.options['batch_size']
+        for start in range(0, len(recipe_ids), batch_size):
+            stored.update(Recipe.objects.filter(
+                pk__in=recipe_ids[start:start + batch_size]
+            ).values_list('id', 'favorites_count'))
+
+        return self.np.maximum(
+            counts, [stored.get(pk, 0) for pk in recipe_ids])
+
+    def top_neighbours(self, products, index, position, norms):
+        """(позиции соседей, близость) для столбца index произведения"""
+        np = self.np
+        start, end = products.indptr[index], products.indptr[index + 1]
+        neighbours = products.indices[start:end]
+        common = products.data[start:end]
+        keep = ((neighbours != position)
+                & (common >= self.options['min_common']))
+        neighbours, common = neighbours[keep], common[keep]
+        scores = common / (norms[neighbours] * norms[position])
+        top_k = self.options['top_k']
+        if len(scores) > top_k:
+            # Все, кто не хуже k-го, - чтобы при равной близости выбор
+            # не зависел от порядка строк и совпадал при любых --chunk-size
+            kth = np.partition(scores, len(scores) - top_k)[-top_k]
+            keep = scores >= kth
+            neighbours, scores = neighbours[keep], scores[keep]
+        order = np.lexsort((neighbours, -scores))[:top_k]
+
+        return neighbours[order], scores[order]
+
+    def save(self, recipe_ids, chunk, products, norms):
+        """Пишет только те списки соседей, что изменились"""
+        fresh = {}
+        for index, position in enumerate(chunk):
+            neighbours, scores = self.top_neighbours(
+                products, index, position, norms)
+            fresh[recipe_ids[position]] = {
+                (recipe_ids[neighbour], score)
+                for neighbour, score in zip(neighbours.tolist(),
+                                            scores.tolist())}
+        current = defaultdict(set)
+        for recipe, similar, score in SimilarRecipe.objects.filter(
+                recipe_id__in=list(fresh)).values_list(
+                'recipe_id', 'similar_id', 'score'):
+            current[recipe].add((similar, score))
+        changed = [recipe for recipe, similar in fresh.items()
+                   if current[recipe] != similar]
+        batch_size = self.options['batch_size']
+        with transaction.atomic():
+            SimilarRecipe.objects.filter(recipe_id__in=changed).delete()
+            SimilarRecipe.objects.bulk_create(
+                (SimilarRecipe(recipe_id=recipe, similar_id=similar,
+                               score=score)
+                 for recipe in changed for similar, score in fresh[recipe]),
+                batch_size=batch_size)
+
+        return len(changed)
+
+    def forget(self, gone):
+        """Рецепты без избранного (или удалённые) остаются без соседей"""
+        gone = list(gone)
+        batch_size = self.options['batch_size']
+        for start in range(0, len(gone), batch_size):
+            SimilarRecipe.objects.filter(
+                recipe_id__in=gone[start:start + batch_size]).delete()
+
+    def delete_changes(self, ids):
+        """Удаляет только прочитанные отметки"""
+        batch_size = self.options['batch_size']
+        for start in range(0, len(ids), batch_size):
+            SimilarityChange.objects.filter(
+                id__in=ids[start:start + batch_size]).delete()
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.trending import decay
+
+
+class Command(BaseCommand):
+    help = ('Применяет затухание к счетам рецептов в тренде и удаляет '
+            'пренебрежимо малые. Запускать по cron каждые '
+            'TRENDING_DECAY_MINUTES минут: затухание считается за этот '
+            'интервал')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--minutes', type=float, default=None,
+            help='За сколько минут применить затухание, по умолчанию '
+                 'TRENDING_DECAY_MINUTES')
+
+    def handle(self, *args, **options):
+        minutes = options['minutes']
+        if minutes is None:
+            minutes = settings.TRENDING_DECAY_MINUTES
+        decayed, removed = decay(minutes)
+        self.stdout.write(self.style.SUCCESS(
+            f'Счетов обновлено: {decayed}, удалено: {removed}'))
@@ -0,0 +1,220 @@
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.cookable_index import cookable_index
+from recipes import counters, timeline
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTag, ShoppingCart, Tag, TimelineEntry)
+from users.models import Subscribe
+
+
+User = get_user_model()
+
+USERNAME_PREFIX = 'gen'
+IMAGE = 'recipe/images/temp.png'
+
+
+class Command(BaseCommand):
+    help = ('Генерирует синтетические данные для нагрузочных тестов: '
+            'пользователей, рецепты, избранное, корзины и подписки. '
+            'Популярность рецептов и авторов распределена по закону '
+            'Ципфа, при одном и том же --seed данные совпадают.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--favorites', type=int, default=100000)
+        parser.add_argument('--carts', type=int, default=20000)
+        parser.add_argument('--subscriptions', type=int, default=50000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--tags-per-recipe', type=int, default=2)
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько последних дней распределены даты рецептов')
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Показатель степени распределения Ципфа')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Сначала удалить ранее сгенерированные данные')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        self.batch_size = options['batch_size']
+        if options['clear']:
+            self.clear()
+        ingredient_ids = list(Ingredient.objects.order_by('id').values_list(
+            'id', flat=True))
+        tag_ids = list(Tag.objects.order_by('id').values_list(
+            'id', flat=True))
+        if not ingredient_ids or not tag_ids:
+            raise CommandError(
+                'Сначала загрузите ингредиенты (load_ingredients) и тэги')
+
+        user_ids = self.step('пользователи', self.create_users)
+        recipe_ids = self.step(
+            'рецепты', self.create_recipes, self.zipf(user_ids))
+        self.step('ингредиенты рецептов', self.create_recipe_ingredients,
+                  recipe_ids, ingredient_ids)
+        self.step('тэги рецептов', self.create_recipe_tags,
+                  recipe_ids, tag_ids)
+        popular_recipes = self.zipf(recipe_ids)
+        self.step('избранное', self.create_pairs, Favorite,
+                  options['favorites'], user_ids, popular_recipes)
+        self.step('корзины', self.create_pairs, ShoppingCart,
+                  options['carts'], user_ids, popular_recipes)
+        self.step('подписки', self.create_subscriptions,
+                  user_ids, self.zipf(user_ids))
+        self.step('ленты подписок', self.fill_timelines)
+        self.step('счётчики', self.fill_counters)
+        cookable_index.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            'Готово. Пересоберите списки покупок: '
+            'manage.py reconcile_shopping_lists'))
+
+    def step(self, title, function, *args):
+        started = time.monotonic()
+        result = function(*args)
+        count = len(result) if isinstance(result, list) else result
+        self.stdout.write(
+            f'{title}: {count} за {time.monotonic() - started:.1f} с')
+
+        return result
+
+    def zipf(self, ids):
+        """(ids, накопленные веса) по закону Ципфа"""
+        ids = list(ids)
+        self.rng.shuffle(ids)
+        weights = (1 / rank ** self.options['skew']
+                   for rank in range(1, len(ids) + 1))
+
+        return ids, list(accumulate(weights))
+
+    def sample(self, population, count):
+        ids, cum_weights = population
+
+        return self.rng.choices(ids, cum_weights=cum_weights, k=count)
+
+    def batches(self, total):
+        for start in range(0, total, self.batch_size):
+            yield start, min(self.batch_size, total - start)
+
+    def clear(self):
+        deleted, _ = User.objects.filter(
+            username__startswith=f'{USERNAME_PREFIX}_').delete()
+        self.stdout.write(f'Удалено объектов: {deleted}')
+
+    def create_users(self):
+        prefix = f'{USERNAME_PREFIX}_{self.options["seed"]}_'
+        for start, size in self.batches(self.options['users']):
+            User.objects.bulk_create(
+                (User(username=f'{prefix}{number}',
+                      email=f'{prefix}{number}@example.com',
+                      first_name='Тест', last_name=f'№{number}',
+                      password='!')
+                 for number in range(start, start + size)),
+                ignore_conflicts=True)
+
+        return list(User.objects.filter(
+            username__startswith=prefix).order_by('id').values_list(
+                'id', flat=True))
+
+    def create_recipes(self, authors):
+        first_id = (Recipe.objects.order_by('-id').values_list(
+            'id', flat=True).first() or 0) + 1
+        for start, size in self.batches(self.options['recipes']):
+            Recipe.objects.bulk_create(
+                Recipe(name=f'Рецепт №{start + number}', author_id=author,
+                       image=IMAGE, text='Синтетический рецепт. ' * 20,
+                       cooking_time=self.rng.randint(5, 180))
+                for number, author in enumerate(
+                    self.sample(authors, size)))
+
+        recipe_ids = list(Recipe.objects.filter(
+            id__gte=first_id).order_by('id').values_list('id', flat=True))
+        self.spread_created(recipe_ids)
+
+        return recipe_ids
+
+    def spread_created(self, recipe_ids):
+        """Даты рецептов вразброс за --days дней, растут вместе с id"""
+        span = timedelta(days=self.options['days']).total_seconds()
+        start = timezone.now() - timedelta(seconds=span)
+        offsets = sorted(self.rng.uniform(0, span) for _ in recipe_ids)
+        Recipe.objects.bulk_update(
+            (Recipe(id=pk, created=start + timedelta(seconds=offset))
+             for pk, offset in zip(recipe_ids, offsets)),
+            ('created',), batch_size=self.batch_size)
+
+    def create_recipe_ingredients(self, recipe_ids, ingredient_ids):
+        per_recipe = min(self.options['ingredients_per_recipe'],
+                         len(ingredient_ids))
+
+        return self.create_links(
+            RecipeIngredient, recipe_ids, lambda recipe_id: (
+                RecipeIngredient(recipe_id=recipe_id, ingredient_id=pk,
+                                 amount=self.rng.randint(1, 500))
+                for pk in self.rng.sample(ingredient_ids, per_recipe)))
+
+    def create_recipe_tags(self, recipe_ids, tag_ids):
+        per_recipe = min(self.options['tags_per_recipe'], len(tag_ids))
+
+        return self.create_links(
+            RecipeTag, recipe_ids, lambda recipe_id: (
+                RecipeTag(recipe_id=recipe_id, tag_id=pk)
+                for pk in self.rng.sample(tag_ids, per_recipe)))
+
+    def create_links(self, model, recipe_ids, make_rows):
+        created = 0
+        for start, size in self.batches(len(recipe_ids)):
+            rows = [row for recipe_id in recipe_ids[start:start + size]
+                    for row in make_rows(recipe_id)]
+            created += len(rows)
+            model.objects.bulk_create(rows)
+
+        return created
+
+    def create_pairs(self, model, total, user_ids, recipes):
+        """Не больше total пар (user, recipe), без повторов"""
+        before = model.objects.count()
+        for _, size in self.batches(total):
+            model.objects.bulk_create(
+                (model(user_id=user_id, recipe_id=recipe_id)
+                 for user_id, recipe_id in zip(
+                     self.rng.choices(user_ids, k=size),
+                     self.sample(recipes, size))),
+                ignore_conflicts=True)
+
+        return model.objects.count() - before
+
+    def create_subscriptions(self, user_ids, authors):
+        before = Subscribe.objects.count()
+        for _, size in self.batches(self.options['subscriptions']):
+            Subscribe.objects.bulk_create(
+                (Subscribe(user_id=user_id, author_id=author_id)
+                 for user_id, author_id in zip(
+                     self.rng.choices(user_ids, k=size),
+                     self.sample(authors, size))
+                 if user_id != author_id),
+                ignore_conflicts=True)
+
+        return Subscribe.objects.count() - before
+
+    def fill_counters(self):
+
+        return sum(counters.reconcile().values())
+
+    def fill_timelines(self):
+        before = TimelineEntry.objects.count()
+        timeline.backfill_all()
+
+        return TimelineEntry.objects.count() - before
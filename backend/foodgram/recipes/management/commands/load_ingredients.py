@@ -0,0 +1,108 @@
+import csv
+import io
+import json
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.ingredient_index import ingredient_index
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = ('Загружает каталог ингредиентов из CSV или JSON '
+            '(data/ingredients.csv, data/ingredients.json). '
+            'Повторный запуск ничего не меняет.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=Path)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать, что будет добавлено и обновлено')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        catalog = self.read(options['path'])
+        inserts, updates = self.diff(catalog)
+        self.stdout.write(
+            f'В файле: {sum(map(len, catalog.values()))}, '
+            f'новых: {len(inserts)}, с новой ед. изм.: {len(updates)}')
+        if options['dry_run'] or not (inserts or updates):
+            self.stdout.write(f'Готово за {time.monotonic() - started:.2f} с')
+
+            return
+
+        with transaction.atomic():
+            Ingredient.objects.bulk_update(
+                updates, ('measurement_unit',),
+                batch_size=options['batch_size'])
+            if connection.vendor == 'postgresql':
+                self.copy(inserts)
+            else:
+                Ingredient.objects.bulk_create(
+                    inserts, batch_size=options['batch_size'])
+        ingredient_index.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.2f} с'))
+
+    def read(self, path):
+        """{название: {ед. изм., ...}} из файла"""
+        if path.suffix not in ('.csv', '.json'):
+            raise CommandError('Поддерживаются только .csv и .json')
+        catalog = {}
+        with open(path, encoding='utf-8') as file:
+            if path.suffix == '.csv':
+                rows = csv.DictReader(file)
+            else:
+                rows = json.load(file)
+            for row in rows:
+                name = row['name'].strip()
+                if not name:
+                    continue
+                unit = row['measurement_unit'].strip()
+                if not unit:
+                    raise CommandError(
+                        f'Не указана единица измерения: {name}')
+                catalog.setdefault(name, set()).add(unit)
+
+        return catalog
+
+    def diff(self, catalog):
+        """Что добавить и что обновить по ключу (название, ед. изм.)"""
+        existing = {}
+        for pk, name, unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit').iterator():
+            existing.setdefault(name, []).append((pk, unit))
+        inserts, updates = [], []
+        for name, units in catalog.items():
+            current = existing.get(name, [])
+            missing = units - {unit for _, unit in current}
+            if not missing:
+                continue
+            if len(units) == 1 and len(current) == 1:
+                updates.append(Ingredient(
+                    id=current[0][0], name=name,
+                    measurement_unit=missing.pop()))
+            else:
+                inserts.extend(
+                    Ingredient(name=name, measurement_unit=unit)
+                    for unit in sorted(missing))
+
+        return inserts, updates
+
+    def copy(self, ingredients):
+        """Вставка одним COPY (только PostgreSQL)"""
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(
+            (ingredient.name, ingredient.measurement_unit)
+            for ingredient in ingredients)
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {Ingredient._meta.db_table} (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv, '
+                'FORCE_NOT_NULL (name, measurement_unit))',
+                buffer)
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = ('Сверяет счётчики популярности (избранное, корзины, рецепты '
+            'и подписчики авторов) с таблицами связей и исправляет '
+            'расхождения. Запускать периодически, например по cron')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только проверить, ничего не меняя')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            wrong = reconcile(fix=not options['check'])
+        for (model, field), count in wrong.items():
+            self.stdout.write(f'{model}.{field}: расхождений {count}')
+        if not any(wrong.values()):
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+
+            return
+        if options['check']:
+            raise CommandError('Счётчики расходятся с таблицами связей')
+
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
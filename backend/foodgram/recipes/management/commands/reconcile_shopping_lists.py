@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import ShoppingListItem
+from recipes.shopping_list import current_totals, expected_totals
+
+
+class Command(BaseCommand):
+    help = ('Сверяет материализованные списки покупок с корзинами '
+            'и исправляет расхождения')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только проверить, ничего не меняя')
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='Ограничиться пользователем (можно указать несколько раз)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        users = options['users']
+        expected = expected_totals(users)
+        current = current_totals(users)
+        missing = expected.keys() - current.keys()
+        stale = current.keys() - expected.keys()
+        wrong = {key for key in expected.keys() & current.keys()
+                 if expected[key] != current[key]}
+        self.stdout.write(
+            f'Позиций в корзинах: {len(expected)}, в списках: {len(current)}; '
+            f'нет в списках: {len(missing)}, лишних: {len(stale)}, '
+            f'с неверной суммой: {len(wrong)}')
+        if not (missing or stale or wrong):
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+
+            return
+        if options['check']:
+            raise CommandError('Списки покупок расходятся с корзинами')
+
+        self.fix(expected, missing, stale, wrong, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Списки покупок пересобраны'))
+
+    def fix(self, expected, missing, stale, wrong, batch_size):
+        ids = self.get_ids(stale | wrong)
+        with transaction.atomic():
+            ShoppingListItem.objects.filter(
+                id__in=[ids[key] for key in stale]).delete()
+            ShoppingListItem.objects.bulk_create(
+                (ShoppingListItem(user_id=user, ingredient_id=ingredient,
+                                  amount=expected[user, ingredient])
+                 for user, ingredient in missing),
+                batch_size=batch_size)
+            ShoppingListItem.objects.bulk_update(
+                (ShoppingListItem(id=ids[key], amount=expected[key])
+                 for key in wrong),
+                ('amount',), batch_size=batch_size)
+
+    def get_ids(self, keys):
+        """{(user_id, ingredient_id): id} позиций с этими ключами"""
+        rows = ShoppingListItem.objects.filter(
+            user__in={user for user, _ in keys}
+        ).values_list('user_id', 'ingredient_id', 'id')
+
+        return {(user, ingredient): pk for user, ingredient, pk in rows
+                if (user, ingredient) in keys}
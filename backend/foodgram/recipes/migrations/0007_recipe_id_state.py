@@ -0,0 +1,23 @@
+# Generated by Django 4.2.2 on 2026-10-17 07:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Только состояние: колонка id в базе уже есть, а в 0005 её нет"""
+
+    dependencies = [
+        ('recipes', '0006_remove_favorite_favorite_user_recipe_and_more'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddField(
+                    model_name='recipe',
+                    name='id',
+                    field=models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID'),
+                ),
+            ],
+        ),
+    ]
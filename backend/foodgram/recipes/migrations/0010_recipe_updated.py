@@ -0,0 +1,24 @@
+# Generated by Django 4.2.2 on 2026-10-17 07:48
+
+from django.db import migrations, models
+
+
+def set_updated_to_created(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.update(updated=models.F('created'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, help_text='Обновляется при каждом сохранении рецепта, в том числе при смене тэгов и ингредиентов через API и админку', verbose_name='Дата изменения'),
+        ),
+        migrations.RunPython(set_updated_to_created, migrations.RunPython.noop),
+    ]
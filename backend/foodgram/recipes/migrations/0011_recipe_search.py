@@ -0,0 +1,111 @@
+from django.db import migrations
+
+
+POSTGRES_FORWARD = [
+    'ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector',
+    '''
+    CREATE FUNCTION recipes_recipe_search_vector() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE' AND OLD.search_vector IS NOT NULL
+                AND NEW.name IS NOT DISTINCT FROM OLD.name
+                AND NEW.text IS NOT DISTINCT FROM OLD.text THEN
+            NEW.search_vector := OLD.search_vector;
+        ELSE
+            NEW.search_vector :=
+                setweight(to_tsvector('russian', coalesce(NEW.name, '')), 'A')
+                || setweight(to_tsvector('russian', coalesce(NEW.text, '')),
+                             'B');
+        END IF;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    ''',
+    '''
+    CREATE TRIGGER recipes_recipe_search_vector
+    BEFORE INSERT OR UPDATE ON recipes_recipe
+    FOR EACH ROW EXECUTE FUNCTION recipes_recipe_search_vector()
+    ''',
+    # Существующие рецепты: вектор у них пустой, триггер его посчитает.
+    'UPDATE recipes_recipe SET search_vector = NULL',
+    'CREATE INDEX recipe_search_vector_idx ON recipes_recipe '
+    'USING GIN (search_vector)',
+]
+
+POSTGRES_BACKWARD = [
+    'DROP TRIGGER recipes_recipe_search_vector ON recipes_recipe',
+    'DROP FUNCTION recipes_recipe_search_vector()',
+    'ALTER TABLE recipes_recipe DROP COLUMN search_vector',
+]
+
+SQLITE_FORWARD = [
+    '''
+    CREATE VIRTUAL TABLE recipes_recipe_fts USING fts5(
+        name, text, content='recipes_recipe', content_rowid='id')
+    ''',
+    '''
+    CREATE TRIGGER recipes_recipe_fts_insert AFTER INSERT ON recipes_recipe
+    BEGIN
+        INSERT INTO recipes_recipe_fts (rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    ''',
+    '''
+    CREATE TRIGGER recipes_recipe_fts_delete AFTER DELETE ON recipes_recipe
+    BEGIN
+        INSERT INTO recipes_recipe_fts (recipes_recipe_fts, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+    END
+    ''',
+    '''
+    CREATE TRIGGER recipes_recipe_fts_update
+    AFTER UPDATE OF name, text ON recipes_recipe
+    BEGIN
+        INSERT INTO recipes_recipe_fts (recipes_recipe_fts, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO recipes_recipe_fts (rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    ''',
+    "INSERT INTO recipes_recipe_fts (recipes_recipe_fts) VALUES ('rebuild')",
+]
+
+# Триггеры пропадают при пересборке таблицы в следующих миграциях
+SQLITE_BACKWARD = [
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_insert',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_delete',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_update',
+    'DROP TABLE IF EXISTS recipes_recipe_fts',
+]
+
+STATEMENTS = {
+    'postgresql': (POSTGRES_FORWARD, POSTGRES_BACKWARD),
+    'sqlite': (SQLITE_FORWARD, SQLITE_BACKWARD),
+}
+
+
+def run(schema_editor, backward):
+    statements = STATEMENTS.get(schema_editor.connection.vendor)
+    if statements is None:
+        return
+    for sql in statements[backward]:
+        schema_editor.execute(sql, params=None)
+
+
+def forwards(apps, schema_editor):
+    run(schema_editor, backward=False)
+
+
+def backwards(apps, schema_editor):
+    run(schema_editor, backward=True)
+
+
+class Migration(migrations.Migration):
+    """Полнотекстовый поиск: индекс только в базе, на триггерах"""
+
+    dependencies = [
+        ('recipes', '0010_recipe_updated'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
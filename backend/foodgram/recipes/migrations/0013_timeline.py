@@ -0,0 +1,91 @@
+# Generated by Django 4.2.2 on 2026-10-17 08:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Копия timeline.BACKFILL_ALL_SQL на момент миграции
+BACKFILL_ALL_SQL = '''
+    INSERT INTO {timeline} (user_id, recipe_id, author_id, created)
+    SELECT user_id, id, author_id, created FROM (
+        SELECT follow.user_id, recipe.id, recipe.author_id, recipe.created,
+               ROW_NUMBER() OVER (
+                   PARTITION BY follow.user_id, follow.author_id
+                   ORDER BY recipe.created DESC, recipe.id DESC) AS position
+        FROM {subscribe} follow
+        INNER JOIN {recipe} recipe ON recipe.author_id = follow.author_id
+    ) ranked
+    WHERE position <= %s
+    ON CONFLICT (user_id, recipe_id) DO NOTHING
+'''
+
+
+def fill_timelines(apps, schema_editor):
+    sql = BACKFILL_ALL_SQL.format(
+        timeline=apps.get_model('recipes', 'TimelineEntry')._meta.db_table,
+        subscribe=apps.get_model('users', 'Subscribe')._meta.db_table,
+        recipe=apps.get_model('recipes', 'Recipe')._meta.db_table,
+    )
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(sql, [settings.TIMELINE_BACKFILL])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0012_similar_recipes'),
+        ('users', '0004_alter_customuser_options_subscribe_unique_follow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(verbose_name='Дата создания рецепта')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Ленты подписок',
+            },
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='fanned_out',
+            field=models.BooleanField(default=True, help_text='False у рецептов популярных авторов: подписчики забирают их в свои ленты сами, при чтении', verbose_name='Разослан в ленты подписчиков'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('fanned_out', False)), fields=['author', '-created'], name='recipe_pull_idx'),
+        ),
+        migrations.AddField(
+            model_name='timelineentry',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор рецепта'),
+        ),
+        migrations.AddField(
+            model_name='timelineentry',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='recipes.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AddField(
+            model_name='timelineentry',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-created', '-recipe'], name='timeline_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', 'author', '-created'], name='timeline_user_author_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='timeline_user_recipe'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.2 on 2026-10-17 08:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingScore',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='recipes.recipe')),
+                ('score', models.FloatField(default=0)),
+            ],
+            options={
+                'ordering': ['-score', 'recipe_id'],
+                'indexes': [models.Index(fields=['-score', 'recipe'], name='trending_score_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.2 on 2026-10-17 08:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_trending'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='similaritystamp',
+            name='favorites_checksum',
+            field=models.BigIntegerField(help_text='Хэш отсортированных id пользователей, добавивших рецепт в избранное'),
+        ),
+    ]
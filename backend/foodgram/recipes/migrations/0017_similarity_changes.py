@@ -0,0 +1,28 @@
+# Generated by Django 4.2.2 on 2026-10-17 09:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_similarity_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarityChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.recipe')),
+            ],
+            options={
+                'verbose_name': 'Изменение избранного',
+                'verbose_name_plural': 'Изменения избранного',
+            },
+        ),
+        migrations.DeleteModel(
+            name='SimilarityStamp',
+        ),
+    ]
@@ -64,11 +64,42 @@ class Recipe(CreatedModel):
         verbose_name='Время приготовления в минутах',
         default=1,
     )
+    updated = models.DateTimeField(
+        verbose_name='Дата изменения',
+        help_text='Обновляется при каждом сохранении рецепта, в том числе '
+                  'при смене тэгов и ингредиентов через API и админку',
+        auto_now=True,
+    )
+    fanned_out = models.BooleanField(
+        verbose_name='Разослан в ленты подписчиков',
+        help_text='False у рецептов популярных авторов: подписчики '
+                  'забирают их в свои ленты сами, при чтении',
+        default=True,
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='В корзинах',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
-        ordering = ['-created']
+        ordering = ['-created', '-id']
+        indexes = [
+            models.Index(fields=['-created', '-id'],
+                         name='recipe_created_id_idx'),
+            models.Index(fields=['author', '-created'],
+                         condition=models.Q(fanned_out=False),
+                         name='recipe_pull_idx'),
+            models.Index(fields=['-favorites_count', '-created', '-id'],
+                         name='recipe_popular_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.name
@@ -164,3 +195,132 @@ class RecipeTag(models.Model):
                 name='recipe_tag'
             )
         ]
+
+
+class ShoppingListItem(models.Model):
+    """Материализованный список покупок пользователя"""
+    user = models.ForeignKey(
+        User,
+        related_name='shopping_list',
+        verbose_name='Владелец списка',
+        on_delete=models.CASCADE,
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент',
+        on_delete=models.CASCADE,
+    )
+    amount = models.IntegerField('Общее количество', default=0)
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Списки покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='shoppinglist_user_ingredient'
+            )
+        ]
+
+
+class SimilarRecipe(models.Model):
+    """Похожие рецепты: кто добавил этот в избранное, добавлял и эти"""
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='similar_recipes',
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        related_name='+',
+        verbose_name='Похожий рецепт',
+        on_delete=models.CASCADE,
+    )
+    score = models.FloatField('Близость')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        ordering = ['recipe', '-score']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='similar_recipe_pair'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['recipe', '-score'],
+                         name='similar_recipe_score_idx'),
+        ]
+
+
+class SimilarityChange(models.Model):
+    """Отметка: избранное рецепта изменилось после расчёта соседей"""
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='+',
+        on_delete=models.CASCADE,
+    )
+
+    class Meta:
+        verbose_name = 'Изменение избранного'
+        verbose_name_plural = 'Изменения избранного'
+
+
+class TimelineEntry(models.Model):
+    """Лента подписок: рецепты авторов, на которых подписан юзер"""
+    user = models.ForeignKey(
+        User,
+        related_name='timeline',
+        verbose_name='Подписчик',
+        on_delete=models.CASCADE,
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='timeline_entries',
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+    )
+    author = models.ForeignKey(
+        User,
+        related_name='+',
+        verbose_name='Автор рецепта',
+        on_delete=models.CASCADE,
+    )
+    created = models.DateTimeField('Дата создания рецепта')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='timeline_user_recipe'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created', '-recipe'],
+                         name='timeline_user_created_idx'),
+            models.Index(fields=['user', 'author', '-created'],
+                         name='timeline_user_author_idx'),
+        ]
+
+
+class TrendingScore(models.Model):
+    """Счёт рецепта в тренде"""
+    recipe = models.OneToOneField(
+        Recipe,
+        primary_key=True,
+        related_name='+',
+        on_delete=models.CASCADE,
+    )
+    score = models.FloatField(default=0)
+
+    class Meta:
+        ordering = ['-score', 'recipe_id']
+        indexes = [
+            models.Index(fields=['-score', 'recipe'],
+                         name='trending_score_idx'),
+        ]
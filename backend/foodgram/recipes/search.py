@@ -0,0 +1,113 @@
+"""Полнотекстовый поиск по названию и тексту рецептов"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, Case, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+
+SEARCH_CONFIG = 'russian'
+
+# Веса столбцов name и text для bm25 в SQLite
+FTS_WEIGHTS = '10.0, 1.0'
+
+PG_QUERY = 'websearch_to_tsquery(%s::regconfig, %s)'
+PG_MATCH = '{table}.search_vector @@ ' + PG_QUERY
+PG_RANK = 'ts_rank({table}.search_vector, ' + PG_QUERY + ')'
+
+SQLITE_INDEX = [
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts USING fts5(
+        name, text, content='recipes_recipe', content_rowid='id')
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_insert
+    AFTER INSERT ON recipes_recipe
+    BEGIN
+        INSERT INTO recipes_recipe_fts (rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_delete
+    AFTER DELETE ON recipes_recipe
+    BEGIN
+        INSERT INTO recipes_recipe_fts (recipes_recipe_fts, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_update
+    AFTER UPDATE OF name, text ON recipes_recipe
+    BEGIN
+        INSERT INTO recipes_recipe_fts (recipes_recipe_fts, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO recipes_recipe_fts (rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    ''',
+]
+SQLITE_TRIGGERS = ('recipes_recipe_fts_insert', 'recipes_recipe_fts_delete',
+                   'recipes_recipe_fts_update')
+SQLITE_REBUILD = (
+    "INSERT INTO recipes_recipe_fts (recipes_recipe_fts) VALUES ('rebuild')")
+
+FTS_MATCH = 'SELECT rowid FROM {fts} WHERE {fts} MATCH %s'
+FTS_RANK = ('SELECT -bm25({fts}, ' + FTS_WEIGHTS + ') FROM {fts} '
+            'WHERE {fts} MATCH %s AND rowid = {table}.id')
+
+
+def sync_sqlite_index(sender, using, **kwargs):
+    """post_migrate: восстанавливает индекс FTS5 и его триггеры"""
+    connection = connections[using]
+    if (connection.vendor != 'sqlite' or 'recipes_recipe'
+            not in connection.introspection.table_names()):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' "
+            'AND name IN (%s, %s, %s)', SQLITE_TRIGGERS)
+        if cursor.fetchone()[0] == len(SQLITE_TRIGGERS):
+            return
+        for sql in SQLITE_INDEX:
+            cursor.execute(sql)
+        cursor.execute(SQLITE_REBUILD)
+
+
+def fts_query(text):
+    """Запрос FTS5: каждое слово в кавычках и с * по началу слова"""
+
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', text))
+
+
+def search(queryset, text):
+    """Рецепты под запрос, по убыванию search_rank"""
+    connection = connections[queryset.db]
+    db_table = queryset.model._meta.db_table
+    table = connection.ops.quote_name(db_table)
+    if connection.vendor == 'postgresql':
+        params = (SEARCH_CONFIG, text)
+        queryset = queryset.filter(RawSQL(
+            PG_MATCH.format(table=table), params,
+            output_field=BooleanField())).annotate(search_rank=RawSQL(
+                PG_RANK.format(table=table), params,
+                output_field=FloatField()))
+    elif connection.vendor == 'sqlite':
+        query = fts_query(text)
+        if not query:
+
+            return queryset.none()
+
+        fts = connection.ops.quote_name(f'{db_table}_fts')
+        queryset = queryset.filter(pk__in=RawSQL(
+            FTS_MATCH.format(fts=fts), (query,))).annotate(
+            search_rank=RawSQL(
+                FTS_RANK.format(fts=fts, table=table), (query,),
+                output_field=FloatField()))
+    else:
+        queryset = queryset.filter(
+            Q(name__icontains=text) | Q(text__icontains=text)).annotate(
+            search_rank=Case(When(name__icontains=text, then=Value(1.0)),
+                             default=Value(0.4)))
+
+    return queryset.order_by('-search_rank', '-created', '-id')
@@ -0,0 +1,104 @@
+"""Поддержка материализованного списка покупок (ShoppingListItem)"""
+from django.db import connection
+from django.db.models import Sum
+
+from .models import RecipeIngredient, ShoppingCart, ShoppingListItem
+
+
+UPSERT_SQL = '''
+    INSERT INTO {item} (user_id, ingredient_id, amount)
+    SELECT cart.user_id, ri.ingredient_id, %s * SUM(ri.amount)
+    FROM {cart} cart
+    INNER JOIN {recipe_ingredient} ri ON ri.recipe_id = cart.recipe_id
+    WHERE cart.recipe_id IN ({recipes})
+    GROUP BY cart.user_id, ri.ingredient_id
+    ON CONFLICT (user_id, ingredient_id)
+    DO UPDATE SET amount = {item}.amount + excluded.amount
+'''
+
+USER_UPSERT_SQL = '''
+    INSERT INTO {item} (user_id, ingredient_id, amount)
+    SELECT %s, ri.ingredient_id, %s * SUM(ri.amount)
+    FROM {recipe_ingredient} ri
+    WHERE ri.recipe_id IN ({recipes})
+    GROUP BY ri.ingredient_id
+    ON CONFLICT (user_id, ingredient_id)
+    DO UPDATE SET amount = {item}.amount + excluded.amount
+'''
+
+
+def _execute(sql, recipe_ids, params):
+    sql = sql.format(
+        item=ShoppingListItem._meta.db_table,
+        cart=ShoppingCart._meta.db_table,
+        recipe_ingredient=RecipeIngredient._meta.db_table,
+        recipes=', '.join(['%s'] * len(recipe_ids)),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*params, *recipe_ids])
+
+
+def _apply_to_carts(recipe_ids, sign):
+    """Прибавить (sign=1) или вычесть ингредиенты у всех в корзине"""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    _execute(UPSERT_SQL, recipe_ids, [sign])
+    if sign < 0:
+        ShoppingListItem.objects.filter(
+            user_id__in=ShoppingCart.objects.filter(
+                recipe_id__in=recipe_ids).values('user_id'),
+            amount__lte=0).delete()
+
+
+def _apply_to_user(recipe_ids, sign, user_id):
+    """То же для списка одного пользователя"""
+    recipe_ids = sorted(set(recipe_ids))
+    if not recipe_ids:
+        return
+    _execute(USER_UPSERT_SQL, recipe_ids, [user_id, sign])
+    if sign < 0:
+        ShoppingListItem.objects.filter(
+            user_id=user_id, amount__lte=0).delete()
+
+
+def add_recipe(recipe_id):
+    """Вызывать после изменения состава рецепта."""
+    _apply_to_carts([recipe_id], 1)
+
+
+def subtract_recipe(recipe_id):
+    """Вызывать до изменения состава или удаления рецепта"""
+    _apply_to_carts([recipe_id], -1)
+
+
+def add_recipes(recipe_ids, user_id):
+    """Вызывать после того, как рецепты добавлены в корзину user_id."""
+    _apply_to_user(recipe_ids, 1, user_id)
+
+
+def subtract_recipes(recipe_ids, user_id):
+    """Вызывать после того, как рецепты удалены из корзины user_id."""
+    _apply_to_user(recipe_ids, -1, user_id)
+
+
+def expected_totals(user_ids=None):
+    """{(user_id, ingredient_id): amount} заново по корзинам"""
+    queryset = RecipeIngredient.objects.filter(
+        recipe__shopping_recipe__isnull=False)
+    if user_ids is not None:
+        queryset = queryset.filter(recipe__shopping_recipe__user__in=user_ids)
+    rows = queryset.values_list(
+        'recipe__shopping_recipe__user', 'ingredient'
+    ).annotate(total=Sum('amount')).order_by()
+
+    return {(user, ingredient): total for user, ingredient, total in rows}
+
+
+def current_totals(user_ids=None):
+    queryset = ShoppingListItem.objects.all()
+    if user_ids is not None:
+        queryset = queryset.filter(user__in=user_ids)
+    rows = queryset.values_list('user_id', 'ingredient_id', 'amount')
+
+    return {(user, ingredient): amount for user, ingredient, amount in rows}
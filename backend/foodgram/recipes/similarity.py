@@ -0,0 +1,19 @@
+"""Очередь рецептов для build_similar_recipes --incremental"""
+from .models import Favorite, SimilarityChange, SimilarRecipe
+
+
+def mark(link_model, recipe_ids):
+    """Отметить рецепты, у которых изменилось избранное"""
+    if link_model is not Favorite:
+        return
+    SimilarityChange.objects.bulk_create(
+        SimilarityChange(recipe_id=recipe_id)
+        for recipe_id in sorted(set(recipe_ids)))
+
+
+def mark_neighbours(recipe_id):
+    """Вызывать перед удалением рецепта: отметить его соседей"""
+    SimilarityChange.objects.bulk_create(
+        SimilarityChange(recipe_id=pk)
+        for pk in SimilarRecipe.objects.filter(
+            similar_id=recipe_id).values_list('recipe_id', flat=True))
@@ -0,0 +1,90 @@
+"""Лента "рецепты авторов, на которых я подписан" (TimelineEntry)"""
+from django.conf import settings
+from django.db import connection
+
+from users.models import Subscribe
+from .models import Recipe, TimelineEntry
+
+
+PULL_SQL = '''
+    INSERT INTO {timeline} (user_id, recipe_id, author_id, created)
+    SELECT follow.user_id, recipe.id, recipe.author_id, recipe.created
+    FROM {subscribe} follow
+    INNER JOIN {recipe} recipe ON recipe.author_id = follow.author_id
+    WHERE follow.user_id = %s AND recipe.fanned_out = %s
+    AND NOT EXISTS (
+        SELECT 1 FROM {timeline} entry
+        WHERE entry.user_id = follow.user_id
+        AND entry.author_id = follow.author_id
+        AND entry.created >= recipe.created)
+    ON CONFLICT (user_id, recipe_id) DO NOTHING
+'''
+
+BACKFILL_ALL_SQL = '''
+    INSERT INTO {timeline} (user_id, recipe_id, author_id, created)
+    SELECT user_id, id, author_id, created FROM (
+        SELECT follow.user_id, recipe.id, recipe.author_id, recipe.created,
+               ROW_NUMBER() OVER (
+                   PARTITION BY follow.user_id, follow.author_id
+                   ORDER BY recipe.created DESC, recipe.id DESC) AS position
+        FROM {subscribe} follow
+        INNER JOIN {recipe} recipe ON recipe.author_id = follow.author_id
+    ) ranked
+    WHERE position <= %s
+    ON CONFLICT (user_id, recipe_id) DO NOTHING
+'''
+
+
+def _entries(user_ids, recipe):
+
+    return (TimelineEntry(user_id=user_id, recipe_id=recipe.id,
+                          author_id=recipe.author_id, created=recipe.created)
+            for user_id in user_ids)
+
+
+def fan_out(recipe):
+    """Вызывать после создания рецепта: разложить по лентам подписчиков"""
+    if recipe.author.followers_count >= settings.TIMELINE_FANOUT_LIMIT:
+        Recipe.objects.filter(pk=recipe.pk).update(fanned_out=False)
+        recipe.fanned_out = False
+        return
+    batch_size = settings.TIMELINE_BATCH_SIZE
+    user_ids = Subscribe.objects.filter(
+        author_id=recipe.author_id).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        _entries(user_ids.iterator(chunk_size=batch_size), recipe),
+        batch_size=batch_size, ignore_conflicts=True)
+
+
+def backfill(user_id, author_id):
+    """Вызывать после подписки: последние рецепты автора в ленту"""
+    recipes = Recipe.objects.filter(author_id=author_id).only(
+        'id', 'author_id', 'created')[:settings.TIMELINE_BACKFILL]
+    TimelineEntry.objects.bulk_create(
+        (entry for recipe in recipes for entry in _entries([user_id], recipe)),
+        ignore_conflicts=True)
+
+
+def trim(user_id, author_id):
+    """Вызывать после отписки: убирает рецепты автора из ленты"""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def _execute(sql, params):
+    sql = sql.format(
+        timeline=TimelineEntry._meta.db_table,
+        subscribe=Subscribe._meta.db_table,
+        recipe=Recipe._meta.db_table,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def backfill_all():
+    """backfill для всех подписок одним запросом"""
+    _execute(BACKFILL_ALL_SQL, [settings.TIMELINE_BACKFILL])
+
+
+def pull(user_id):
+    """Вызывать перед чтением ленты: новые рецепты популярных авторов"""
+    _execute(PULL_SQL, [user_id, False])
@@ -0,0 +1,67 @@
+"""Рецепты в тренде: счёт с затуханием (TrendingScore)"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from .models import Favorite, ShoppingCart, TrendingScore
+
+
+# Вес действия: корзина - намерение приготовить, оно весомее избранного
+WEIGHTS = {
+    Favorite: 1.0,
+    ShoppingCart: 2.0,
+}
+
+SNAPSHOT_KEY = 'trending:snapshot'
+
+UPSERT_SQL = '''
+    INSERT INTO {table} (recipe_id, score)
+    VALUES {values}
+    ON CONFLICT (recipe_id)
+    DO UPDATE SET score = {table}.score + excluded.score
+'''
+
+
+def record(link_model, recipe_ids, delta):
+    """Учесть создание (delta > 0) или удаление связей с recipe_ids"""
+    weight = WEIGHTS.get(link_model)
+    recipe_ids = sorted(set(recipe_ids))
+    if weight is None or not recipe_ids:
+        return
+    if delta < 0:
+        TrendingScore.objects.filter(recipe_id__in=recipe_ids).update(
+            score=Greatest(F('score') - weight, 0.0))
+        return
+    sql = UPSERT_SQL.format(
+        table=TrendingScore._meta.db_table,
+        values=', '.join(['(%s, %s)'] * len(recipe_ids)),
+    )
+    params = [value for recipe_id in recipe_ids
+              for value in (recipe_id, weight * delta)]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def decay(minutes):
+    """Затухание за minutes минут; возвращает (затронуто, удалено)"""
+    factor = 0.5 ** (minutes / 60 / settings.TRENDING_HALF_LIFE)
+    decayed = TrendingScore.objects.update(score=F('score') * factor)
+    removed, _ = TrendingScore.objects.filter(
+        score__lt=settings.TRENDING_MIN_SCORE).delete()
+
+    return decayed, removed
+
+
+def top():
+    """[(recipe_id, score)] - первые TRENDING_LIMIT рецептов"""
+    snapshot = cache.get(SNAPSHOT_KEY)
+    if snapshot is None:
+        snapshot = list(TrendingScore.objects.filter(
+            score__gte=settings.TRENDING_MIN_SCORE
+        ).values_list('recipe_id', 'score')[:settings.TRENDING_LIMIT])
+        cache.set(SNAPSHOT_KEY, snapshot,
+                  timeout=settings.TRENDING_SNAPSHOT_TTL)
+
+    return snapshot